@@ -18,6 +18,10 @@ which python3 || which python
 echo "Directorio actual: $(pwd)"
 ls -la /app
 
+# Migrar las estadísticas al esquema actual si hace falta (con el bot detenido)
+echo "Comprobando el esquema de estadísticas..."
+cd /app && PYTHONPATH=/app/src python3 -m tools.migrate_stats --if-needed || exit 1
+
 # Iniciar el bot
 echo "Iniciando el bot..."
 cd /app && python3 src/main.py 
\ No newline at end of file
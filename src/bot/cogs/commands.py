@@ -1,15 +1,22 @@
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
-from models.stats import Database
+from utils.logger import get_logging_stats
+from utils.profiler import ProfilerBusy
 
 logger = logging.getLogger(__name__)
 
+def format_eta(seconds: float) -> str:
+    """Formatear segundos como '1m 05s' o '42s'"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
 class CommandsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
         
     @app_commands.command(name="narrar", description="Narra un texto en inglés")
     async def narrate(self, interaction: discord.Interaction, texto: str):
@@ -17,14 +24,32 @@ class CommandsCog(commands.Cog):
         try:
             await interaction.response.defer()
             
+            trace = self.bot.tracer.start_trace(
+                "narrar",
+                guild_id=interaction.guild_id,
+                channel_id=interaction.channel_id,
+                user_id=interaction.user.id
+            )
+            
             # Narrar el texto
-            await self.bot.narrate_english(
+            action = await self.bot.narrate_english(
                 texto, 
                 interaction.user,
-                str(interaction.channel_id)
+                str(interaction.channel_id),
+                trace=trace
             )
             
-            await interaction.followup.send("✅ Texto agregado a la cola de narración")
+            eta = self.bot.queue_manager.backlog_seconds(interaction.guild_id)
+            if action == 'reject':
+                await interaction.followup.send(
+                    f"⏳ Cola de narración llena ({format_eta(eta)} pendientes), texto descartado"
+                )
+            elif action == 'summarize':
+                await interaction.followup.send("✂️ Cola de narración cargada: se narrará solo la primera frase")
+            elif action is None:
+                await interaction.followup.send("❌ Error al procesar la narración")
+            else:
+                await interaction.followup.send("✅ Texto agregado a la cola de narración")
             
         except Exception as e:
             logger.error(f"Error en comando narrar: {str(e)}")
@@ -37,7 +62,8 @@ class CommandsCog(commands.Cog):
             await interaction.response.defer()
             
             # Obtener estadísticas
-            queue_size = len(self.bot.queue_manager.queue)
+            queue_size = self.bot.queue_manager.queue_size(interaction.guild_id)
+            backlog = self.bot.queue_manager.backlog_seconds(interaction.guild_id)
             voice_connected = bool(interaction.guild.voice_client)
             
             embed = discord.Embed(
@@ -53,7 +79,9 @@ class CommandsCog(commands.Cog):
             
             embed.add_field(
                 name="Cola de Audio",
-                value=f"📝 {queue_size} elementos en cola",
+                value=f"📝 {queue_size} elementos en cola\n"
+                      f"⏱️ Tiempo estimado para vaciarla: {format_eta(backlog)}\n"
+                      f"🗣️ Velocidad de narración: {self.bot.tts.rate_controller.current(interaction.guild_id):.2f}x",
                 inline=False
             )
             
@@ -70,7 +98,7 @@ class CommandsCog(commands.Cog):
             await interaction.response.defer()
             
             # Obtener estadísticas del canal
-            channel_stats = self.db.get_channel_stats(str(interaction.channel_id))
+            channel_stats = self.db.get_channel_stats(interaction.channel_id)
             
             embed = discord.Embed(
                 title="Estadísticas de Uso",
@@ -102,7 +130,7 @@ class CommandsCog(commands.Cog):
             await interaction.response.defer()
             
             # Limpiar cola
-            self.bot.queue_manager.clear_queue()
+            self.bot.queue_manager.clear_queue(interaction.guild_id)
             
             await interaction.followup.send("🧹 Cola de reproducción limpiada")
             
@@ -131,7 +159,9 @@ class CommandsCog(commands.Cog):
     @app_commands.choices(tipo=[
         app_commands.Choice(name="general", value="general"),
         app_commands.Choice(name="voz", value="voice"),
-        app_commands.Choice(name="audio", value="audio")
+        app_commands.Choice(name="audio", value="audio"),
+        app_commands.Choice(name="traducción", value="translation"),
+        app_commands.Choice(name="consumo", value="usage")
     ])
     async def metrics(self, interaction: discord.Interaction, tipo: str = "general"):
         """Mostrar métricas del bot"""
@@ -167,6 +197,21 @@ class CommandsCog(commands.Cog):
                           f"Tiempo promedio en cola: {stats['audio']['average_queue_time']}",
                     inline=False
                 )
+                log_stats = get_logging_stats()
+                embed.add_field(
+                    name="📝 Logs",
+                    value=f"En cola: {log_stats['queued']}\n"
+                          f"Descartados: {log_stats['dropped']}",
+                    inline=False
+                )
+                if self.bot.loop_monitor is not None:
+                    lag_stats = self.bot.loop_monitor.stats()
+                    embed.add_field(
+                        name="🔁 Event Loop",
+                        value=f"Retraso p50/p99: ≤{lag_stats['p50_ms']:.0f} / ≤{lag_stats['p99_ms']:.0f} ms\n"
+                              f"Máximo: {lag_stats['max_ms']:.0f} ms · Bloqueos: {lag_stats['stalls']}",
+                        inline=False
+                    )
 
             elif tipo == "voice":
                 # Métricas de voz
@@ -189,6 +234,77 @@ class CommandsCog(commands.Cog):
                     value=f"Tiempo en canales: {stats['voice']['total_audio_time']}",
                     inline=False
                 )
+                embed.add_field(
+                    name="🔀 Cambios de Canal",
+                    value=f"Cambios: {stats['voice']['channel_switches']} "
+                          f"(promedio {stats['voice']['average_switch_time']:.2f}s)\n"
+                          f"Clips agrupados sin cambiar de canal: {stats['voice']['switches_avoided']}",
+                    inline=False
+                )
+
+            elif tipo == "translation":
+                # Métricas del filtro previo a la traducción
+                filter_stats = self.bot.translator.prefilter.stats()
+                reasons = "\n".join(
+                    f"{reason}: {count}" for reason, count in sorted(filter_stats['reasons'].items())
+                ) or "Sin datos"
+                embed.add_field(
+                    name="🌐 Llamadas Evitadas",
+                    value=f"Mensajes evaluados: {filter_stats['checked']}\n"
+                          f"Llamadas evitadas: {filter_stats['calls_saved']}\n"
+                          f"Caracteres no enviados: {filter_stats['chars_saved']}",
+                    inline=False
+                )
+                embed.add_field(
+                    name="🔎 Clasificación",
+                    value=reasons,
+                    inline=False
+                )
+                cache_stats = self.bot.translator.cache_stats()
+                embed.add_field(
+                    name="🗂️ Caché de Plantillas",
+                    value=f"Plantillas: {cache_stats['entries']}\n"
+                          f"Aciertos: {cache_stats['hits']} / Fallos: {cache_stats['misses']}",
+                    inline=False
+                )
+
+            elif tipo == "usage":
+                # Consumo estimado de Google TTS y Translate (últimas 24 horas)
+                ledger = self.bot.usage_ledger
+                usage_stats = ledger.stats()
+                budgets = " · ".join(
+                    f"{label}: ${budget:.2f}" for label, budget in
+                    (("hora", ledger.hourly_budget), ("día", ledger.daily_budget)) if budget > 0
+                ) or "sin límite"
+                embed.add_field(
+                    name="💵 Gasto Estimado",
+                    value=f"Última hora: ${usage_stats['hour_cost']:.2f} · Último día: ${usage_stats['day_cost']:.2f}\n"
+                          f"Presupuesto: {budgets} ({usage_stats['budget_fraction'] * 100:.0f}% usado)\n"
+                          f"Nivel: `{usage_stats['tier']}` · Cambios de nivel: {usage_stats['tier_changes']}",
+                    inline=False
+                )
+                totals = ledger.totals()
+                embed.add_field(
+                    name="📡 Por API",
+                    value="\n".join(
+                        f"{api}: {values['requests']:.0f} peticiones, {values['characters']:.0f} caracteres, "
+                        f"${values['cost']:.2f}"
+                        for api, values in sorted(totals.items())
+                    ) or "Sin llamadas",
+                    inline=False
+                )
+                mentions = {'guild': '{}', 'channel': '<#{}>', 'user': '<@{}>'}
+                for scope, title in (("guild", "🏠 Servidores"), ("channel", "💬 Canales"), ("user", "👤 Usuarios")):
+                    top = ledger.top(scope, 5)
+                    embed.add_field(
+                        name=title,
+                        value="\n".join(
+                            f"{mentions[scope].format(object_id) if object_id else 'precalentamiento'}: "
+                            f"${cost:.2f} ({characters:.0f} caracteres)"
+                            for object_id, cost, characters in top
+                        ) or "Sin datos",
+                        inline=True
+                    )
 
             else:  # audio
                 # Métricas de audio
@@ -210,6 +326,57 @@ class CommandsCog(commands.Cog):
                     value=f"Tasa de éxito: {stats['audio']['success_rate']:.1f}%",
                     inline=False
                 )
+                normalizer_stats = self.bot.tts.normalizer.stats()
+                embed.add_field(
+                    name="✂️ Texto Compactado",
+                    value=f"Mensajes: {normalizer_stats['messages']}\n"
+                          f"Caracteres ahorrados: {normalizer_stats['chars_saved']} "
+                          f"de {normalizer_stats['chars_in']}\n"
+                          f"Audio evitado: {normalizer_stats['seconds_saved']:.0f}s",
+                    inline=False
+                )
+                admission_stats = self.bot.admission.stats()
+                embed.add_field(
+                    name="🚦 Control de Admisión",
+                    value=f"Resumidos: {admission_stats['summarized']} / "
+                          f"Rechazados: {admission_stats['rejected']}\n"
+                          f"Audio descartado: {format_eta(admission_stats['seconds_shed'])}",
+                    inline=False
+                )
+                store_stats = self.bot.audio_store.stats()
+                embed.add_field(
+                    name="💾 Archivos de Audio",
+                    value=f"Archivos: {store_stats['files']} ({store_stats['referenced']} en uso)\n"
+                          f"Tamaño: {store_stats['total_bytes'] / 1048576:.1f} MB\n"
+                          f"Eliminados: {store_stats['removed_files']}\n"
+                          f"En caché: {store_stats['cached']} "
+                          f"(aciertos {store_stats['cache_hits']} / fallos {store_stats['cache_misses']})",
+                    inline=False
+                )
+                fanout_stats = self.bot.metrics_manager.get_fanout_stats()
+                if fanout_stats:
+                    embed.add_field(
+                        name="📡 Fan-out",
+                        value="\n".join(
+                            f"<#{target['voice_channel_id']}>: {target['deliveries']} entregados, "
+                            f"{target['failures']} fallidos · {target['average_latency']:.1f}s promedio "
+                            f"({target['max_latency']:.1f}s máx)"
+                            for target in fanout_stats[:10]
+                        ),
+                        inline=False
+                    )
+                if self.bot.cache_warmer is not None:
+                    warmer_stats = self.bot.cache_warmer.stats()
+                    last_run = warmer_stats['last_run']
+                    embed.add_field(
+                        name="🔥 Precalentamiento",
+                        value=f"Última pasada: {last_run.strftime('%H:%M:%S') + ' UTC' if last_run else 'pendiente'}\n"
+                              f"Llamadas a la API: {warmer_stats['api_calls']} "
+                              f"(fallidas {warmer_stats['failures']})\n"
+                              f"Audios: {warmer_stats['warmed_audio']} / "
+                              f"Plantillas: {warmer_stats['warmed_translations']}",
+                        inline=False
+                    )
 
             await interaction.followup.send(embed=embed)
             
@@ -217,5 +384,142 @@ class CommandsCog(commands.Cog):
             logger.error(f"Error en comando metrics: {str(e)}")
             await interaction.followup.send("❌ Error al obtener métricas")
 
+    @app_commands.command(name="trazas", description="Muestra los mensajes recientes más lentos")
+    @app_commands.describe(limite="Cantidad de mensajes a mostrar")
+    @app_commands.default_permissions(administrator=True)
+    async def traces(self, interaction: discord.Interaction, limite: app_commands.Range[int, 1, 10] = 5):
+        """Mostrar las trazas recientes más lentas con su desglose por etapa"""
+        try:
+            await interaction.response.defer(ephemeral=True)
+            
+            slowest = self.bot.tracer.slowest(limite, guild_id=interaction.guild_id)
+            
+            embed = discord.Embed(
+                title="🐢 Mensajes más lentos",
+                color=discord.Color.orange()
+            )
+            
+            if not slowest:
+                embed.description = "No hay trazas registradas"
+                
+            for trace in slowest:
+                stages = sorted(trace.stage_durations().items(), key=lambda item: item[1], reverse=True)
+                breakdown = "\n".join(
+                    f"`{name}`: {duration * 1000:.0f} ms" for name, duration in stages
+                )
+                embed.add_field(
+                    name=f"{trace.duration:.2f}s · {trace.origin} · {trace.status} · `{trace.trace_id}`",
+                    value=f"<t:{int(trace.started_at)}:T> <@{trace.user_id}>\n{breakdown or 'Sin etapas'}",
+                    inline=False
+                )
+                
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            
+        except Exception as e:
+            logger.error(f"Error en comando trazas: {str(e)}")
+            await interaction.followup.send("❌ Error al obtener las trazas", ephemeral=True)
+
+    @app_commands.command(name="bucle", description="Muestra el retraso del event loop y los bloqueos recientes")
+    @app_commands.describe(limite="Cantidad de bloqueos a mostrar")
+    @app_commands.default_permissions(administrator=True)
+    async def loop_lag(self, interaction: discord.Interaction, limite: app_commands.Range[int, 1, 5] = 3):
+        """Mostrar el histograma de retraso del event loop y las pilas de los últimos bloqueos"""
+        try:
+            await interaction.response.defer(ephemeral=True)
+            
+            monitor = self.bot.loop_monitor
+            if monitor is None:
+                await interaction.followup.send("El monitor del event loop está desactivado", ephemeral=True)
+                return
+                
+            lag_stats = monitor.stats()
+            embed = discord.Embed(
+                title="🔁 Event Loop",
+                description=f"Promedio: {lag_stats['average_ms']:.1f} ms · p50: ≤{lag_stats['p50_ms']:.0f} ms · "
+                            f"p99: ≤{lag_stats['p99_ms']:.0f} ms · Máximo: {lag_stats['max_ms']:.0f} ms\n"
+                            f"Bloqueos de más de {monitor.threshold * 1000:.0f} ms: {lag_stats['stalls']}",
+                color=discord.Color.orange()
+            )
+            histogram = "\n".join(
+                f"{label:>9} {count:>8}" for label, count in monitor.histogram() if count
+            )
+            embed.add_field(
+                name="📊 Histograma de retraso",
+                value=f"```{histogram or 'Sin muestras'}```",
+                inline=False
+            )
+            
+            for stall in monitor.recent_stalls(limite):
+                # Las líneas más internas de la pila son las que identifican el bloqueo
+                stack = stall.stack[-900:]
+                embed.add_field(
+                    name=f"{stall.duration * 1000:.0f} ms · {stall.timestamp.strftime('%H:%M:%S')} UTC",
+                    value=f"```{stack}```",
+                    inline=False
+                )
+                
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            
+        except Exception as e:
+            logger.error(f"Error en comando bucle: {str(e)}")
+            await interaction.followup.send("❌ Error al obtener el estado del event loop", ephemeral=True)
+
+    @app_commands.command(name="perfil", description="Perfila el proceso del bot durante unos segundos")
+    @app_commands.describe(segundos="Duración del muestreo", top="Cantidad de funciones a mostrar")
+    @app_commands.default_permissions(administrator=True)
+    async def profile(self, interaction: discord.Interaction,
+                      segundos: app_commands.Range[int, 1, 120] = 10,
+                      top: app_commands.Range[int, 5, 20] = 10):
+        """Muestrear todos los hilos del proceso y mostrar las funciones más calientes (solo el dueño)"""
+        try:
+            if not await self.bot.is_owner(interaction.user):
+                await interaction.response.send_message("❌ Solo el dueño del bot puede perfilarlo", ephemeral=True)
+                return
+                
+            profiler = self.bot.profiler
+            if profiler.running:
+                await interaction.response.send_message("⏳ Ya hay una sesión de perfilado en curso", ephemeral=True)
+                return
+                
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            try:
+                result = await profiler.profile(segundos)
+            except ProfilerBusy:
+                await interaction.followup.send("⏳ Ya hay una sesión de perfilado en curso", ephemeral=True)
+                return
+            path = await asyncio.to_thread(result.save, self.bot.config.PROFILER_OUTPUT_DIR)
+            
+            embed = discord.Embed(
+                title="🔬 Perfil del proceso",
+                description=f"{result.samples} muestras en {result.duration:.0f}s "
+                            f"(cada {profiler.interval * 1000:.0f} ms). % de muestras: propio / acumulado",
+                color=discord.Color.orange()
+            )
+            samples = max(result.samples, 1)
+            hottest = "\n".join(
+                f"{own / samples * 100:5.1f}% {total / samples * 100:5.1f}% {frame[:70]}"
+                for frame, own, total in result.top_functions(top)
+            )
+            embed.add_field(
+                name="🔥 Funciones más calientes",
+                value=f"```{hottest[:1000] or 'Todos los hilos estaban en espera'}```",
+                inline=False
+            )
+            threads = "\n".join(
+                f"{busy * 100:5.1f}% {thread[:40]}" for thread, busy in result.thread_busy().items()
+            )
+            embed.add_field(
+                name="🧵 Hilos (tiempo ocupado)",
+                value=f"```{threads[:1000] or 'Sin muestras'}```",
+                inline=False
+            )
+            embed.set_footer(text="Pilas colapsadas adjuntas (flamegraph.pl / speedscope)")
+            
+            await interaction.followup.send(embed=embed, file=discord.File(path), ephemeral=True)
+            
+        except Exception as e:
+            logger.error(f"Error en comando perfil: {str(e)}")
+            await interaction.followup.send("❌ Error al perfilar el proceso", ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(CommandsCog(bot)) 
\ No newline at end of file
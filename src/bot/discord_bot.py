@@ -1,18 +1,38 @@
+import asyncio
+import hashlib
+import json
 import os
 import discord
 from discord.ext import commands
 import logging
 import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+from services.router import ChannelRoute, ChannelRouter
 from services.translator import TranslationService
 from services.tts import TTSService
-from services.queue_manager import AudioQueueManager
+from services.queue_manager import AudioQueueManager, BacklogReservation
 from services.metrics_manager import MetricsManager
-from utils.config import Config
+from services.admission import AdmissionController, AdmissionDecision
+from services.audio_store import AudioArtifactStore
+from services.cache_warmer import CacheWarmer
+from services.traffic_trace import TrafficCapture
+from services.usage_ledger import UsageLedger
+from services.worker_pool import SynthesisWorkerPool
+from models.stats import Database
+from utils.config import get_config
+from utils.loop_monitor import LoopLagMonitor
+from utils.profiler import SamplingProfiler
+from utils.startup import startup_timer
+from utils.tracing import Tracer
 
 logger = logging.getLogger(__name__)
 
+COGS_DIR = Path(__file__).resolve().parent / 'cogs'
+
 class NarradorBot(commands.Bot):
-    def __init__(self):
+    def __init__(self, **kwargs):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.voice_states = True
@@ -20,23 +40,96 @@ class NarradorBot(commands.Bot):
         super().__init__(
             command_prefix='/',
             intents=intents,
-            help_command=None
+            help_command=None,
+            **kwargs
         )
         
-        # Inicializar servicios
+        # Cargar configuración
+        self.config = get_config()
+        
+        # Inicializar servicios; los clientes de Google se crean en setup_hook
         logger.info("Iniciando servicios...")
-        self.translator = TranslationService()
-        logger.info("TranslationService iniciado")
-        self.tts = TTSService()
-        logger.info("TTSService iniciado")
-        self.metrics_manager = MetricsManager()
-        logger.info("MetricsManager iniciado")
-        self.queue_manager = AudioQueueManager(self)
-        logger.info("AudioQueueManager iniciado")
+        with startup_timer.phase("servicios.database"):
+            self.db = Database()
+        if self.db.legacy_schema:
+            # Sin migrar no se guardarían estadísticas; mejor no arrancar
+            raise RuntimeError(
+                "La base de estadísticas usa el esquema anterior: ejecuta "
+                "'python -m tools.migrate_stats' (desde src/) con el bot detenido"
+            )
+        self.worker_pool = None
+        if self.config.SYNTH_WORKERS > 0:
+            with startup_timer.phase("servicios.worker_pool"):
+                self.worker_pool = SynthesisWorkerPool(self.config.SYNTH_WORKERS)
+        self.audio_store = AudioArtifactStore(
+            self.config.AUDIO_TEMP_DIR,
+            max_bytes=self.config.AUDIO_MAX_BYTES,
+            max_age=self.config.AUDIO_MAX_AGE,
+            janitor_interval=self.config.AUDIO_JANITOR_INTERVAL
+        )
+        self.usage_ledger = UsageLedger(
+            hourly_budget=self.config.USAGE_BUDGET_HOURLY,
+            daily_budget=self.config.USAGE_BUDGET_DAILY,
+            thresholds=self.config.USAGE_DEGRADE_THRESHOLDS,
+            premium_tts_price=self.config.TTS_PREMIUM_PRICE,
+            standard_tts_price=self.config.TTS_STANDARD_PRICE,
+            translate_price=self.config.TRANSLATE_PRICE,
+            store=self.db,
+            on_tier_change=lambda previous, tier: self.metrics_manager.record_usage_tier(previous, tier)
+        )
+        with startup_timer.phase("servicios.translator"):
+            self.translator = TranslationService(self.db, self.worker_pool, self.usage_ledger)
+        with startup_timer.phase("servicios.tts"):
+            self.tts = TTSService(self.db, self.worker_pool, self.audio_store, self.usage_ledger)
+        with startup_timer.phase("servicios.metrics"):
+            self.metrics_manager = MetricsManager()
+        with startup_timer.phase("servicios.queue"):
+            self.queue_manager = AudioQueueManager(self)
+        self.admission = AdmissionController(
+            max_backlog_seconds=self.config.ADMISSION_MAX_BACKLOG_SECONDS,
+            policy=self.config.ADMISSION_POLICY,
+            summary_chars=self.config.ADMISSION_SUMMARY_CHARS,
+            chars_per_second=self.config.TTS_CHARS_PER_SECOND
+        )
+        with startup_timer.phase("servicios.router"):
+            self.router = ChannelRouter.load(self.config, self.db)
+        self.cache_warmer = None
+        if self.config.CACHE_WARMUP_ENABLED:
+            self.cache_warmer = CacheWarmer(
+                self.db,
+                self.tts,
+                self.translator,
+                self.router,
+                budget=self.config.CACHE_WARMUP_BUDGET,
+                lookback_hours=self.config.CACHE_WARMUP_LOOKBACK_HOURS,
+                min_count=self.config.CACHE_WARMUP_MIN_COUNT,
+                interval=self.config.CACHE_WARMUP_INTERVAL
+            )
+        self.traffic_capture = None
+        if self.config.TRAFFIC_CAPTURE_FILE:
+            self.traffic_capture = TrafficCapture(
+                self.config.TRAFFIC_CAPTURE_FILE,
+                salt=self.config.TRAFFIC_CAPTURE_SALT,
+                translator=self.translator
+            )
+        logger.info("Servicios iniciados")
         
-        # Cargar configuración
-        self.config = Config()
-        logger.info("Configuración cargada")
+        self._retention_task: Optional[asyncio.Task] = None
+        self._usage_persist_task: Optional[asyncio.Task] = None
+        self.loop_monitor = None
+        if self.config.LOOP_MONITOR_ENABLED:
+            self.loop_monitor = LoopLagMonitor(
+                interval=self.config.LOOP_MONITOR_INTERVAL,
+                threshold=self.config.LOOP_STALL_THRESHOLD
+            )
+        # Sin coste mientras no hay una sesión de /perfil en curso
+        self.profiler = SamplingProfiler(interval=self.config.PROFILER_INTERVAL)
+        
+        # Trazas por mensaje
+        self.tracer = Tracer(
+            buffer_size=self.config.TRACE_BUFFER_SIZE,
+            sample_rate=self.config.TRACE_SAMPLE_RATE
+        )
         
         # Registrar eventos
         self.setup_events()
@@ -44,21 +137,157 @@ class NarradorBot(commands.Bot):
         
     async def setup_hook(self):
         """Configuración inicial del bot"""
-        await self.load_cogs()
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        with startup_timer.phase("setup_hook"):
+            # Crear los clientes de Google en paralelo con la carga de cogs
+            await asyncio.gather(
+                self._load_cogs_and_sync(),
+                self._init_google_clients(),
+                self._init_audio_store()
+            )
+        # Corre en segundo plano tras on_ready; no retrasa el arranque
+        if self.cache_warmer is not None:
+            self.cache_warmer.start(self)
+        if self.config.STATS_RETENTION_DAYS > 0:
+            self._retention_task = asyncio.create_task(self._stats_retention())
+        self._usage_persist_task = asyncio.create_task(self._persist_usage())
+            
+    async def _init_audio_store(self):
+        """Eliminar audio huérfano de ejecuciones anteriores e iniciar el janitor"""
+        with startup_timer.phase("audio_store"):
+            await asyncio.to_thread(self.audio_store.reconcile)
+        self.audio_store.start_janitor()
+        
+    async def close(self):
+        """Cerrar el bot y detener los procesos trabajadores"""
+        await super().close()
+        self.audio_store.stop_janitor()
+        if self.cache_warmer is not None:
+            self.cache_warmer.stop()
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+        if self._usage_persist_task is not None:
+            self._usage_persist_task.cancel()
+        # El consumo de la hora en curso se guarda para el próximo arranque
+        self.usage_ledger.flush()
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
+        if self.traffic_capture is not None:
+            self.traffic_capture.close()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+        
+    async def _stats_retention(self):
+        """Eliminar periódicamente las estadísticas fuera de la ventana de retención"""
+        while True:
+            try:
+                await asyncio.to_thread(
+                    self.db.apply_retention,
+                    self.config.STATS_RETENTION_DAYS,
+                    self.config.STATS_RETENTION_BATCH
+                )
+            except Exception as e:
+                logger.error(f"Error aplicando retención de estadísticas: {str(e)}")
+            await asyncio.sleep(self.config.STATS_RETENTION_INTERVAL)
+            
+    async def _persist_usage(self):
+        """Guardar periódicamente el consumo de Google para que sobreviva a un reinicio"""
+        while True:
+            await asyncio.sleep(self.config.USAGE_PERSIST_INTERVAL)
+            await asyncio.to_thread(self.usage_ledger.flush)
+            
+    async def _init_google_clients(self):
+        """Crear los clientes de Google en hilos, en paralelo"""
+        if self.worker_pool is not None:
+            # Cada proceso trabajador crea sus propios clientes
+            return
+            
+        async def create(name, factory):
+            with startup_timer.phase(f"cliente.{name}"):
+                try:
+                    await asyncio.to_thread(factory)
+                except Exception as e:
+                    # Se reintentará en el primer uso
+                    logger.error(f"Error creando cliente {name}: {str(e)}")
         
+        await asyncio.gather(
+            create("translate", lambda: self.translator.client),
+            create("tts", lambda: self.tts.client)
+        )
+        
+    async def _load_cogs_and_sync(self):
+        await self.load_cogs()
+        with startup_timer.phase("command_sync"):
+            await self.sync_commands(force=self.config.COMMAND_SYNC_FORCE)
+            
     async def load_cogs(self):
         """Cargar todos los cogs (comandos y eventos)"""
+        with startup_timer.phase("cogs"):
+            await self._load_cogs()
+            
+    async def _load_cogs(self):
         logger.info("Iniciando carga de cogs...")
-        for filename in os.listdir('./src/bot/cogs'):
-            if filename.endswith('.py'):
+        # Ruta del paquete, independiente del directorio de trabajo
+        for filename in sorted(os.listdir(COGS_DIR)):
+            if filename.endswith('.py') and not filename.startswith('_'):
                 try:
                     logger.info(f'Intentando cargar cog: {filename}')
-                    await self.load_extension(f'bot.cogs.{filename[:-3]}')
+                    await self.load_extension(f'{__package__}.cogs.{filename[:-3]}')
                     logger.info(f'Cog cargado exitosamente: {filename}')
                 except Exception as e:
                     logger.error(f'Error al cargar cog {filename}: {str(e)}')
                     logger.error(f'Detalles del error: {e.__class__.__name__}')
         logger.info("Proceso de carga de cogs finalizado")
+        
+    def command_tree_hash(self) -> str:
+        """Hash de las firmas de los comandos slash registrados"""
+        payload = sorted(
+            (command.to_dict() for command in self.tree.get_commands()),
+            key=lambda command: (command.get('type', 1), command['name'])
+        )
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+        
+    async def sync_commands(self, force: bool = False) -> bool:
+        """Sincronizar los comandos slash solo si cambiaron desde la última sincronización.
+
+        El hash de la última sincronización se guarda en COMMAND_SYNC_STATE_FILE.
+        Devuelve True si se llamó a la API.
+        """
+        state_file = self.config.COMMAND_SYNC_STATE_FILE
+        tree_hash = self.command_tree_hash()
+        state = {}
+        try:
+            with open(state_file, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Estado de sincronización de comandos ilegible: {str(e)}")
+            
+        if not force and state.get('hash') == tree_hash and state.get('application_id') == self.application_id:
+            logger.info("Comandos sin cambios desde la última sincronización, se omite")
+            return False
+            
+        try:
+            logger.info("Sincronizando comandos...")
+            synced = await self.tree.sync()
+            logger.info(f"Comandos sincronizados exitosamente: {len(synced)}")
+        except Exception as e:
+            logger.error(f"Error sincronizando comandos: {str(e)}")
+            return True
+            
+        try:
+            os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+            with open(state_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'hash': tree_hash,
+                    'application_id': self.application_id,
+                    'synced_at': datetime.utcnow().isoformat()
+                }, f)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el estado de sincronización de comandos: {str(e)}")
+        return True
                     
     def setup_events(self):
         """Configurar eventos del bot"""
@@ -66,71 +295,231 @@ class NarradorBot(commands.Bot):
         @self.event
         async def on_ready():
             logger.info(f'Bot conectado como {self.user.name}')
-            # Sincronizar comandos slash
-            try:
-                logger.info("Sincronizando comandos...")
-                await self.tree.sync()
-                logger.info("Comandos sincronizados exitosamente")
-            except Exception as e:
-                logger.error(f"Error sincronizando comandos: {str(e)}")
+            if startup_timer.mark_ready():
+                startup_timer.log_report()
+            # Los comandos se sincronizan una sola vez en setup_hook, no en cada reconexión
             await self.change_presence(activity=discord.Game(name="/help para comandos"))
             
         @self.event
         async def on_message(message):
-            if message.author == self.user:
+            # Los canales sin ruta salen antes de cualquier otro trabajo
+            route = self.router.get(message.channel.id)
+            if route is None or message.author.id == self.user.id:
                 return
                 
-            # Procesar mensajes en canales específicos
-            if str(message.channel.id) in [
-                self.config.ENGLISH_CHANNEL_ID,
-                self.config.SPANISH_CHANNEL_ID
-            ]:
-                await self.process_channel_message(message)
-                
-            await self.process_commands(message)
+            await self.process_channel_message(message, route)
             
-    async def process_channel_message(self, message):
-        """Procesar mensajes en canales específicos"""
+    async def process_channel_message(self, message, route: Optional[ChannelRoute] = None):
+        """Procesar mensajes en canales con ruta configurada"""
+        if route is None:
+            route = self.router.get(message.channel.id)
+            if route is None:
+                return
+                
+        if self.traffic_capture is not None:
+            self.traffic_capture.record(message, route)
+        trace = self.tracer.start_trace(
+            "message",
+            guild_id=message.guild.id if message.guild else None,
+            channel_id=message.channel.id,
+            user_id=message.author.id
+        )
+        reservation = None
         try:
             channel_id = str(message.channel.id)
             
-            # Canal en inglés - narración directa
-            if channel_id == self.config.ENGLISH_CHANNEL_ID:
-                await self.narrate_english(
-                    message.content,
-                    message.author,
-                    channel_id
-                )
-                
-            # Canal en español - traducir y narrar
-            elif channel_id == self.config.SPANISH_CHANNEL_ID:
-                translated_text = await self.translator.translate(
-                    message.content,
+            # Admisión antes de traducir: lo rechazado o resumido no paga la
+            # traducción completa (se estima con la longitud del original)
+            decision, speaking_rate, reservation = self._admit(
+                message.content, message.guild, route.targets, trace
+            )
+            if decision.action == 'reject':
+                return
+            text = decision.text
+            
+            # Traducir si el canal no está en el idioma de narración
+            if route.needs_translation:
+                text = await self.translator.translate(
+                    text,
                     channel_id,
-                    str(message.author.id)
-                )
-                await self.narrate_english(
-                    translated_text,
-                    message.author,
-                    channel_id
+                    str(message.author.id),
+                    trace=trace,
+                    source_language=route.source_language,
+                    target_language=route.target_language,
+                    guild_id=message.guild.id if message.guild else None,
+                    low_priority=route.low_priority
                 )
+                if text is None:
+                    # Canal de baja prioridad sin presupuesto para traducir
+                    self.tracer.finish(trace, "budget")
+                    return
+                
+            await self._narrate(
+                text,
+                message.author,
+                channel_id,
+                speaking_rate,
+                trace=trace,
+                route=route,
+                reservation=reservation
+            )
                 
         except Exception as e:
             logger.error(f'Error procesando mensaje: {str(e)}')
+            self.tracer.finish(trace, "error")
             await message.channel.send('❌ Error al procesar el mensaje')
+        finally:
+            # Sin audio encolado (sin presupuesto, vacío o error) la reserva se libera aquí
+            self.queue_manager.release(reservation)
             
-    async def narrate_english(self, text, author, channel_id):
-        """Narrar texto en inglés"""
+    def _mention_resolver(self, guild):
+        """Resolver menciones de Discord a nombres legibles en un servidor"""
+        def resolve(kind, object_id):
+            if kind == 'user':
+                member = guild.get_member(object_id) if guild else None
+                user = member or self.get_user(object_id)
+                return user.display_name if user else None
+            if guild is None:
+                return None
+            target = guild.get_role(object_id) if kind == 'role' else guild.get_channel(object_id)
+            return target.name if target else None
+        return resolve
+        
+    async def narrate_english(self, text, author, channel_id, trace=None,
+                              route: Optional[ChannelRoute] = None) -> Optional[str]:
+        """Narrar texto ya en el idioma de la voz (en inglés, o con la voz de la ruta).
+
+        Devuelve la decisión de admisión ('accept', 'summarize' o 'reject'),
+        o None si hubo un error.
+        """
         try:
+            guild = getattr(author, 'guild', None)
+            decision, speaking_rate, reservation = self._admit(
+                text, guild, route.targets if route else (), trace
+            )
+        except Exception as e:
+            logger.error(f'Error en narración: {str(e)}')
+            self.tracer.finish(trace, "error")
+            return None
+        if decision.action == 'reject':
+            return decision.action
+        try:
+            narrated = await self._narrate(decision.text, author, channel_id, speaking_rate,
+                                           trace=trace, route=route, reservation=reservation)
+        finally:
+            self.queue_manager.release(reservation)
+        return decision.action if narrated else None
+        
+    def _admit(self, text, guild, targets,
+               trace=None) -> Tuple[AdmissionDecision, float, Optional[BacklogReservation]]:
+        """Rechazar o resumir si la cola del servidor ya no podría drenarse a tiempo.
+
+        Cuenta el audio en cola y el reservado por narraciones admitidas que
+        aún se traducen o sintetizan, y reserva la duración estimada del texto
+        admitido en cada servidor de destino, para que una ráfaga no entre
+        entera antes de que llegue el primer clip. Devuelve la decisión, la
+        velocidad de narración elegida y la reserva (None si se rechaza); un
+        rechazo ya cierra la traza.
+        """
+        busiest_guild_id, queued, reserved = self._narration_backlog(guild, targets)
+        backlog = queued + reserved
+        # Con la cola cargada se narra más rápido; lo reservado cuenta para
+        # que una ráfaga acelere antes de que su primer clip llegue a la cola
+        speaking_rate = self.tts.choose_speaking_rate(busiest_guild_id, backlog)
+        decision = self.admission.check(text, backlog, speaking_rate)
+        if decision.action != 'accept':
+            if trace:
+                trace.add_span("admission", time.perf_counter(), time.perf_counter(),
+                               action=decision.action, eta=round(decision.eta, 1))
+            logger.warning(
+                f"Narración {'resumida' if decision.action == 'summarize' else 'rechazada'}: "
+                f"{decision.eta:.0f}s de audio pendientes"
+            )
+        if decision.action == 'reject':
+            self.tracer.finish(trace, "rejected")
+            return decision, speaking_rate, None
+        
+        guild_ids = [guild_id for guild_id, _ in targets] if targets else ([guild.id] if guild else [])
+        reservation = self.queue_manager.reserve(
+            guild_ids, self.admission.estimate_seconds(decision.text, speaking_rate)
+        )
+        return decision, speaking_rate, reservation
+        
+    async def _narrate(self, text, author, channel_id, speaking_rate: float, trace=None,
+                       route: Optional[ChannelRoute] = None,
+                       reservation: Optional[BacklogReservation] = None) -> bool:
+        """Sintetizar un texto ya admitido y encolarlo; False si hubo un error.
+
+        Al encolar, la reserva de admisión se sustituye por la duración real.
+        """
+        try:
+            guild = getattr(author, 'guild', None)
+            targets = route.targets if route else ()
+            
             # Generar audio
             audio_file = await self.tts.generate_audio(
                 text,
                 channel_id,
-                str(author.id)
+                str(author.id),
+                trace=trace,
+                voice_name=route.voice_name if route else None,
+                language_code=route.language_code if route else None,
+                resolver=self._mention_resolver(guild),
+                speaking_rate=speaking_rate,
+                guild_id=guild.id if guild else None
             )
+            if audio_file is None:
+                self.tracer.finish(trace, "empty")
+                return True
+                
+            if targets:
+                # Un solo audio para todos los destinos configurados
+                await self.queue_manager.fan_out(audio_file, author, targets, trace=trace,
+                                                 reservation=reservation)
+                return True
             
             # Agregar a la cola de reproducción
-            await self.queue_manager.add_to_queue(audio_file, author)
+            try:
+                await self.queue_manager.add_to_queue(
+                    audio_file,
+                    author,
+                    trace=trace,
+                    voice_channel_id=route.voice_channel_id if route else None,
+                    reservation=reservation
+                )
+            except Exception:
+                self.audio_store.release(audio_file)
+                raise
+            return True
             
         except Exception as e:
-            logger.error(f'Error en narración: {str(e)}') 
\ No newline at end of file
+            logger.error(f'Error en narración: {str(e)}')
+            self.tracer.finish(trace, "error")
+            return False
+
+    def _narration_backlog(self, guild, targets) -> Tuple[Optional[int], float, float]:
+        """Servidor cuya cola decide la velocidad y la admisión (el más cargado de los destinos).
+
+        Devuelve su id, los segundos en cola y los reservados por narraciones en curso.
+        """
+        guild_ids = {guild_id for guild_id, _ in targets} if targets else ({guild.id} if guild else set())
+        if not guild_ids:
+            return None, 0.0, 0.0
+        return max(
+            (
+                (guild_id, self.queue_manager.backlog_seconds(guild_id),
+                 self.queue_manager.reserved_seconds(guild_id))
+                for guild_id in guild_ids
+            ),
+            key=lambda item: item[1] + item[2]
+        )
+
+class ShardedNarradorBot(NarradorBot, commands.AutoShardedBot):
+    """NarradorBot con gateway repartido en shards (AutoShardedBot)"""
+
+    def __init__(self):
+        config = get_config()
+        kwargs = {}
+        if config.SHARD_COUNT:
+            kwargs['shard_count'] = config.SHARD_COUNT
+        super().__init__(**kwargs)
@@ -1,30 +1,36 @@
-import os
+from utils.startup import startup_timer
 import logging
-from dotenv import load_dotenv
-from bot.discord_bot import NarradorBot
-from utils.logger import setup_logging
 
-# Cargar variables de entorno
-load_dotenv()
+with startup_timer.phase("imports"):
+    from bot.discord_bot import NarradorBot, ShardedNarradorBot
+    from utils.config import get_config
+    from utils.logger import setup_logging
 
-# Configurar logging
-setup_logging()
 logger = logging.getLogger(__name__)
 
 def main():
+    # La configuración y el logging se preparan aquí y no al importar el
+    # módulo, porque los procesos trabajadores (spawn) lo vuelven a importar
+    with startup_timer.phase("config"):
+        config = get_config()
+    with startup_timer.phase("logging"):
+        setup_logging()
+        
     try:
         # Obtener token de Discord
-        token = os.getenv('DISCORD_TOKEN')
+        token = config.DISCORD_TOKEN
         if not token:
             raise ValueError("No se encontró el token de Discord en las variables de entorno")
 
         # Inicializar y ejecutar el bot
-        bot = NarradorBot()
-        bot.run(token)
+        with startup_timer.phase("bot_init"):
+            bot = ShardedNarradorBot() if config.BOT_SHARDED else NarradorBot()
+        # Los logs de discord.py pasan por el pipeline de setup_logging
+        bot.run(token, log_handler=None)
 
     except Exception as e:
         logger.error(f"Error al iniciar el bot: {str(e)}", exc_info=True)
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,54 +1,206 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, Float, Boolean, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import logging
-from utils.config import Config
+import os
+import threading
+from utils.config import get_config
 
 logger = logging.getLogger(__name__)
 Base = declarative_base()
 
+# Ids de texto recientes en memoria, para no consultar el diccionario en cada insert
+TEXT_ID_CACHE_SIZE = 4096
+
+def text_hash(value: str) -> int:
+    """Hash de 64 bits con signo (cabe en un INTEGER de SQLite) de un texto"""
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def _as_int(value) -> Optional[int]:
+    """Convertir ids de Discord (str o int) a entero"""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class TextEntry(Base):
+    """Diccionario de textos: cada texto distinto se guarda una sola vez"""
+    __tablename__ = 'texts'
+    
+    id = Column(Integer, primary_key=True)
+    hash = Column(Integer, index=True)
+    text = Column(String)
+
 class TranslationStats(Base):
     __tablename__ = 'translation_stats'
     
     id = Column(Integer, primary_key=True)
-    channel_id = Column(String)
-    user_id = Column(String)
-    original_text = Column(String)
-    translated_text = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    channel_id = Column(Integer)
+    user_id = Column(Integer)
+    original_text_id = Column(Integer, index=True)
+    translated_text_id = Column(Integer, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     processing_time = Column(Float)
 
 class TTSStats(Base):
     __tablename__ = 'tts_stats'
     
     id = Column(Integer, primary_key=True)
-    channel_id = Column(String)
-    user_id = Column(String)
-    text = Column(String)
-    audio_file = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    channel_id = Column(Integer)
+    user_id = Column(Integer)
+    text_id = Column(Integer, index=True)
+    speaking_rate = Column(Float)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     processing_time = Column(Float)
 
+class ChannelRouteConfig(Base):
+    __tablename__ = 'channel_routes'
+    
+    channel_id = Column(Integer, primary_key=True, autoincrement=False)
+    guild_id = Column(Integer)
+    source_language = Column(String, default='en')
+    target_language = Column(String, default='en')
+    voice_name = Column(String)
+    language_code = Column(String)
+    voice_channel_id = Column(Integer)
+    low_priority = Column(Boolean, default=False)
+    targets = Column(String)  # JSON: [{"guild_id": ..., "voice_channel_id": ...}] para fan-out
+    enabled = Column(Boolean, default=True)
+
+class UsageBucket(Base):
+    """Consumo de Google por hora, API y ámbito (servidor, canal o usuario)"""
+    __tablename__ = 'usage_buckets'
+    
+    hour = Column(Integer, primary_key=True, autoincrement=False)  # horas desde la época Unix
+    api = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)
+    object_id = Column(Integer, primary_key=True, autoincrement=False)
+    characters = Column(Integer, default=0)
+    requests = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+
+# Tablas anteriores con el texto completo en cada fila -> columnas del esquema actual
+LEGACY_TABLES = {
+    'translation_stats': (
+        "SELECT channel_id, user_id, original_text, translated_text, timestamp, processing_time",
+        "INSERT INTO translation_stats (channel_id, user_id, original_text_id, translated_text_id, "
+        "timestamp, processing_time) VALUES (:channel_id, :user_id, :text_a, :text_b, :timestamp, "
+        ":processing_time)"
+    ),
+    'tts_stats': (
+        "SELECT channel_id, user_id, text, NULL, timestamp, processing_time",
+        "INSERT INTO tts_stats (channel_id, user_id, text_id, timestamp, processing_time) "
+        "VALUES (:channel_id, :user_id, :text_a, :timestamp, :processing_time)"
+    )
+}
+
 class Database:
-    def __init__(self):
-        self.config = Config()
-        self.engine = create_engine(f'sqlite:///{self.config.DB_PATH}')
+    def __init__(self, db_path: Optional[str] = None):
+        self.config = get_config()
+        self.db_path = db_path or self.config.DB_PATH
+        self.engine = create_engine(f'sqlite:///{self.db_path}')
+        event.listen(self.engine, 'connect', self._on_connect)
         self.Session = sessionmaker(bind=self.engine)
         
+        # El diccionario de textos se comparte entre los inserts y la retención
+        self._text_lock = threading.Lock()
+        self._text_ids: OrderedDict = OrderedDict()
+        
+        # Las bases con el esquema anterior (texto completo en cada fila) se
+        # migran solo con tools.migrate_stats: puede tardar y compacta el
+        # archivo. El bot no arranca con ellas (ver NarradorBot.__init__)
+        self.legacy_schema = self.needs_migration()
+        if self.legacy_schema:
+            logger.warning("Esquema de estadísticas anterior detectado: hay que ejecutar "
+                           "'python -m tools.migrate_stats' con el bot detenido")
+        
         # Crear tablas si no existen
         Base.metadata.create_all(self.engine)
+        self._add_missing_columns()
+    
+    @staticmethod
+    def _on_connect(dbapi_connection, connection_record):
+        # En una base nueva activa el vacuum incremental; en una existente
+        # solo surte efecto tras un VACUUM completo (ver vacuum())
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.close()
+    
+    def _add_missing_columns(self):
+        """Agregar a tablas existentes las columnas nuevas del modelo (siempre opcionales).
+
+        Las tablas de estadísticas con el esquema anterior no se tocan hasta migrarlas.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                if self.legacy_schema and table.name in LEGACY_TABLES:
+                    continue
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                        logger.info(f"Columna agregada: {table.name}.{column.name}")
+                        
+    def needs_migration(self) -> bool:
+        """Comprobar si las estadísticas usan el esquema con texto en cada fila"""
+        inspector = inspect(self.engine)
+        if not inspector.has_table('translation_stats'):
+            return False
+        columns = {column['name'] for column in inspector.get_columns('translation_stats')}
+        return 'original_text' in columns
+    
+    def _intern(self, session, value: Optional[str]) -> Optional[int]:
+        """Obtener el id de un texto en el diccionario, agregándolo si no existe"""
+        if value is None:
+            return None
+        # El lock solo protege el caché en memoria, nunca una consulta
+        with self._text_lock:
+            text_id = self._text_ids.get(value)
+            if text_id is not None:
+                self._text_ids.move_to_end(value)
+                return text_id
+        
+        # Las colisiones de hash se resuelven comparando el texto
+        value_hash = text_hash(value)
+        for entry in session.query(TextEntry).filter_by(hash=value_hash):
+            if entry.text == value:
+                text_id = entry.id
+                break
+        else:
+            entry = TextEntry(hash=value_hash, text=value)
+            session.add(entry)
+            session.flush()
+            text_id = entry.id
         
-    def add_translation(self, channel_id: str, user_id: str, original_text: str, 
+        with self._text_lock:
+            self._text_ids[value] = text_id
+            if len(self._text_ids) > TEXT_ID_CACHE_SIZE:
+                self._text_ids.popitem(last=False)
+        return text_id
+    
+    def _forget_text_ids(self):
+        with self._text_lock:
+            self._text_ids.clear()
+    
+    def add_translation(self, channel_id: str, user_id: str, original_text: str,
                        translated_text: str, processing_time: float):
         """Agregar estadísticas de traducción"""
+        if self.legacy_schema:
+            return
         try:
             session = self.Session()
             stats = TranslationStats(
-                channel_id=channel_id,
-                user_id=user_id,
-                original_text=original_text,
-                translated_text=translated_text,
+                channel_id=_as_int(channel_id),
+                user_id=_as_int(user_id),
+                original_text_id=self._intern(session, original_text),
+                translated_text_id=self._intern(session, translated_text),
                 processing_time=processing_time
             )
             session.add(stats)
@@ -56,19 +208,23 @@ class Database:
         except Exception as e:
             logger.error(f"Error al guardar estadísticas de traducción: {str(e)}")
             session.rollback()
+            # Los ids recién agregados al caché pueden no haberse guardado
+            self._forget_text_ids()
         finally:
             session.close()
-            
-    def add_tts(self, channel_id: str, user_id: str, text: str, 
-                audio_file: str, processing_time: float):
+    
+    def add_tts(self, channel_id: str, user_id: str, text: str, processing_time: float,
+                speaking_rate: Optional[float] = None):
         """Agregar estadísticas de TTS"""
+        if self.legacy_schema:
+            return
         try:
             session = self.Session()
             stats = TTSStats(
-                channel_id=channel_id,
-                user_id=user_id,
-                text=text,
-                audio_file=audio_file,
+                channel_id=_as_int(channel_id),
+                user_id=_as_int(user_id),
+                text_id=self._intern(session, text),
+                speaking_rate=speaking_rate,
                 processing_time=processing_time
             )
             session.add(stats)
@@ -76,23 +232,25 @@ class Database:
         except Exception as e:
             logger.error(f"Error al guardar estadísticas de TTS: {str(e)}")
             session.rollback()
+            self._forget_text_ids()
         finally:
             session.close()
-            
-    def get_channel_stats(self, channel_id: str):
+    
+    def get_channel_stats(self, channel_id: int):
         """Obtener estadísticas por canal"""
         try:
             session = self.Session()
             
-            # Estadísticas de traducción
-            translation_count = session.query(TranslationStats).filter_by(
-                channel_id=channel_id
-            ).count()
+            # Solo se usan id y channel_id, que también existen en el esquema
+            # anterior (donde channel_id es texto y SQLite convierte el entero)
+            translation_count = session.query(func.count(TranslationStats.id)).filter(
+                TranslationStats.channel_id == _as_int(channel_id)
+            ).scalar()
             
             # Estadísticas de TTS
-            tts_count = session.query(TTSStats).filter_by(
-                channel_id=channel_id
-            ).count()
+            tts_count = session.query(func.count(TTSStats.id)).filter(
+                TTSStats.channel_id == _as_int(channel_id)
+            ).scalar()
             
             return {
                 'translation_count': translation_count,
@@ -102,4 +260,285 @@ class Database:
             logger.error(f"Error al obtener estadísticas: {str(e)}")
             return {'translation_count': 0, 'tts_count': 0}
         finally:
-            session.close() 
\ No newline at end of file
+            session.close()
+    
+    def get_frequent_tts_texts(self, since: datetime, min_count: int = 2,
+                               limit: int = 500) -> List[Tuple[int, str, int]]:
+        """Textos narrados con más frecuencia desde ``since``: (channel_id, texto, veces)"""
+        if self.legacy_schema:
+            return []
+        try:
+            session = self.Session()
+            uses = func.count(TTSStats.id)
+            rows = (
+                session.query(TTSStats.channel_id, TextEntry.text, uses)
+                .join(TextEntry, TextEntry.id == TTSStats.text_id)
+                .filter(TTSStats.timestamp >= since)
+                .group_by(TTSStats.channel_id, TTSStats.text_id)
+                .having(uses >= min_count)
+                .order_by(uses.desc())
+                .limit(limit)
+                .all()
+            )
+            return [(channel_id, text, count) for channel_id, text, count in rows]
+        except Exception as e:
+            logger.error(f"Error al obtener textos frecuentes de TTS: {str(e)}")
+            return []
+        finally:
+            session.close()
+    
+    def get_recent_translations(self, since: datetime, limit: int = 5000) -> List[Tuple[int, str]]:
+        """Textos originales traducidos desde ``since``: (channel_id, texto)"""
+        if self.legacy_schema:
+            return []
+        try:
+            session = self.Session()
+            rows = (
+                session.query(TranslationStats.channel_id, TextEntry.text)
+                .join(TextEntry, TextEntry.id == TranslationStats.original_text_id)
+                .filter(TranslationStats.timestamp >= since)
+                .order_by(TranslationStats.id.desc())
+                .limit(limit)
+                .all()
+            )
+            return [(channel_id, text) for channel_id, text in rows]
+        except Exception as e:
+            logger.error(f"Error al obtener traducciones recientes: {str(e)}")
+            return []
+        finally:
+            session.close()
+    
+    def get_message_events(self, since: datetime,
+                           until: Optional[datetime] = None) -> List[Tuple[str, datetime, int, int, int]]:
+        """Filas de estadísticas en orden temporal: (tipo, instante, channel_id, text_id, longitud).
+
+        ``tipo`` es 'translation' (texto original) o 'tts' (texto narrado).
+        """
+        if self.legacy_schema:
+            return []
+        try:
+            session = self.Session()
+            events = []
+            for kind, model, text_column in (
+                ('translation', TranslationStats, TranslationStats.original_text_id),
+                ('tts', TTSStats, TTSStats.text_id)
+            ):
+                query = (
+                    session.query(model.timestamp, model.channel_id, text_column, func.length(TextEntry.text))
+                    .outerjoin(TextEntry, TextEntry.id == text_column)
+                    .filter(model.timestamp >= since)
+                )
+                if until is not None:
+                    query = query.filter(model.timestamp < until)
+                events.extend((kind, *row) for row in query.all())
+            events.sort(key=lambda event: event[1])
+            return events
+        except Exception as e:
+            logger.error(f"Error al obtener eventos de mensajes: {str(e)}")
+            return []
+        finally:
+            session.close()
+    
+    def get_channel_routes(self):
+        """Obtener las rutas de canales habilitadas"""
+        try:
+            session = self.Session()
+            routes = session.query(ChannelRouteConfig).filter_by(enabled=True).all()
+            return [
+                {
+                    'channel_id': route.channel_id,
+                    'guild_id': route.guild_id,
+                    'source_language': route.source_language,
+                    'target_language': route.target_language,
+                    'voice_name': route.voice_name,
+                    'language_code': route.language_code,
+                    'voice_channel_id': route.voice_channel_id,
+                    'low_priority': bool(route.low_priority),
+                    'targets': route.targets
+                }
+                for route in routes
+            ]
+        except Exception as e:
+            logger.error(f"Error al obtener rutas de canales: {str(e)}")
+            return []
+        finally:
+            session.close()
+    
+    def get_usage_buckets(self, since_hour: int) -> List[Tuple[int, str, str, int, int, int, float]]:
+        """Cubos de consumo desde ``since_hour``: (hora, api, ámbito, id, caracteres, peticiones, coste)"""
+        try:
+            session = self.Session()
+            rows = (
+                session.query(UsageBucket.hour, UsageBucket.api, UsageBucket.scope, UsageBucket.object_id,
+                              UsageBucket.characters, UsageBucket.requests, UsageBucket.cost)
+                .filter(UsageBucket.hour >= since_hour)
+                .order_by(UsageBucket.hour)
+                .all()
+            )
+            return [tuple(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error al obtener el consumo guardado: {str(e)}")
+            return []
+        finally:
+            session.close()
+    
+    def save_usage_buckets(self, buckets: List[Tuple[int, Dict[Tuple[str, str, int], List[float]]]],
+                           keep_hours: int = 24):
+        """Reemplazar los cubos de consumo de las horas dadas y borrar los de más de ``keep_hours``"""
+        session = self.Session()
+        try:
+            for hour, bucket in buckets:
+                session.query(UsageBucket).filter(UsageBucket.hour == hour).delete()
+                session.add_all([
+                    UsageBucket(hour=hour, api=api, scope=scope, object_id=object_id,
+                                characters=int(characters), requests=int(requests), cost=cost)
+                    for (api, scope, object_id), (characters, requests, cost) in bucket.items()
+                ])
+            if buckets:
+                newest = max(hour for hour, _ in buckets)
+                session.query(UsageBucket).filter(UsageBucket.hour <= newest - keep_hours).delete()
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def apply_retention(self, days: float, batch_size: int = 5000,
+                        vacuum_pages: int = 1000) -> Dict[str, int]:
+        """Eliminar estadísticas más antiguas que ``days`` días.
+        
+        Se borra en lotes de ``batch_size`` filas, cada uno en una transacción
+        corta para no bloquear los inserts del bot; luego se eliminan los
+        textos sin referencias y se liberan hasta ``vacuum_pages`` páginas con
+        incremental_vacuum.
+        """
+        if self.legacy_schema:
+            return {}
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        removed = {}
+        
+        for table in ('translation_stats', 'tts_stats'):
+            removed[table] = self._delete_in_batches(
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE timestamp < :cutoff LIMIT :batch)",
+                {'cutoff': cutoff, 'batch': batch_size}
+            )
+        
+        removed['texts'] = self._delete_in_batches(
+            "DELETE FROM texts WHERE id IN (SELECT t.id FROM texts t WHERE "
+            "NOT EXISTS (SELECT 1 FROM tts_stats WHERE text_id = t.id) AND "
+            "NOT EXISTS (SELECT 1 FROM translation_stats WHERE original_text_id = t.id) AND "
+            "NOT EXISTS (SELECT 1 FROM translation_stats WHERE translated_text_id = t.id) "
+            "LIMIT :batch)",
+            {'batch': batch_size},
+            forget_text_ids=True
+        )
+        
+        if any(removed.values()):
+            self.incremental_vacuum(vacuum_pages)
+            logger.info(f"Retención de estadísticas: {removed}")
+        return removed
+    
+    def _delete_in_batches(self, statement: str, params: dict, forget_text_ids: bool = False) -> int:
+        total = 0
+        while True:
+            deleted = self._execute(statement, params)
+            if forget_text_ids and deleted:
+                # Solo se borran textos sin referencias, que no deberían estar
+                # en el caché de recientes; se vacía por si acaso
+                self._forget_text_ids()
+            total += deleted
+            if deleted < params['batch']:
+                return total
+    
+    def _execute(self, statement: str, params: dict) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(text(statement), params).rowcount
+    
+    def migrate_legacy_stats(self, batch_size: int = 5000) -> Dict[str, int]:
+        """Migrar las estadísticas con texto por fila al diccionario de textos.
+        
+        channel_id y user_id pasan a enteros y cada texto a su id; la ruta del
+        archivo de audio se descarta porque los archivos son temporales. Al
+        terminar se compacta la base con vacuum().
+        """
+        migrated = {'translation_stats': 0, 'tts_stats': 0}
+        text_ids: Dict[str, int] = {}
+        
+        def intern(conn, value):
+            if value is None:
+                return None
+            text_id = text_ids.get(value)
+            if text_id is None:
+                text_id = conn.execute(
+                    TextEntry.__table__.insert().values(hash=text_hash(value), text=value)
+                ).inserted_primary_key[0]
+                text_ids[value] = text_id
+            return text_id
+        
+        with self.engine.begin() as conn:
+            inspector = inspect(conn)
+            tables = [table for table in LEGACY_TABLES if inspector.has_table(table)]
+            for table in tables:
+                # Los índices conservan su nombre al renombrar la tabla
+                for index in inspector.get_indexes(table):
+                    conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+                conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_legacy"))
+            Base.metadata.create_all(conn)
+            
+            for table in tables:
+                select, insert = LEGACY_TABLES[table]
+                result = conn.execute(text(f"{select} FROM {table}_legacy ORDER BY id"))
+                while True:
+                    rows = result.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    # Las fechas se copian tal cual, ya están en el formato de SQLAlchemy
+                    conn.execute(text(insert), [
+                        {
+                            'channel_id': _as_int(channel_id),
+                            'user_id': _as_int(user_id),
+                            'text_a': intern(conn, text_a),
+                            'text_b': intern(conn, text_b),
+                            'timestamp': timestamp,
+                            'processing_time': processing_time
+                        }
+                        for channel_id, user_id, text_a, text_b, timestamp, processing_time in rows
+                    ])
+                    migrated[table] += len(rows)
+                conn.execute(text(f"DROP TABLE {table}_legacy"))
+        
+        migrated['texts'] = len(text_ids)
+        logger.info(f"Estadísticas migradas: {migrated}")
+        self.legacy_schema = False
+        self._add_missing_columns()
+        self.vacuum()
+        return migrated
+    
+    def incremental_vacuum(self, pages: int):
+        """Devolver al sistema hasta ``pages`` páginas libres"""
+        # sqlite3.execute avanza la pragma un solo paso (una página); executescript la completa
+        connection = self.engine.raw_connection()
+        try:
+            connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        finally:
+            connection.close()
+            
+    def vacuum(self):
+        """Compactar la base; en bases existentes también activa auto_vacuum = INCREMENTAL"""
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+    
+    def size_report(self) -> dict:
+        """Tamaño del archivo, páginas libres y filas por tabla"""
+        path = self.db_path
+        report = {'bytes': os.path.getsize(path) if os.path.exists(path) else 0, 'rows': {}}
+        with self.engine.connect() as conn:
+            for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum'):
+                report[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+            for table in inspect(conn).get_table_names():
+                report['rows'][table] = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+        return report
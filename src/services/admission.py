@@ -0,0 +1,68 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?])\s')
+
+@dataclass
+class AdmissionDecision:
+    action: str  # 'accept', 'summarize' o 'reject'
+    text: str
+    eta: float  # segundos de audio pendientes en el servidor
+
+class AdmissionController:
+    """Control de admisión de narraciones según el tiempo de drenaje de la cola.
+
+    Si el audio pendiente de un servidor más la duración estimada del nuevo
+    texto supera ``max_backlog_seconds``, el texto se rechaza o, con la
+    política ``summarize``, se recorta a su primera frase (como máximo
+    ``summary_chars`` caracteres) si así cabe en el límite.
+    """
+
+    def __init__(self, max_backlog_seconds: float, policy: str = 'summarize',
+                 summary_chars: int = 120, chars_per_second: float = 14.0):
+        self.max_backlog_seconds = max_backlog_seconds
+        self.policy = policy
+        self.summary_chars = summary_chars
+        self.chars_per_second = chars_per_second
+        self.decisions: Counter = Counter()
+        self.seconds_shed = 0.0
+
+    def estimate_seconds(self, text: str, speaking_rate: float = 1.0) -> float:
+        """Duración aproximada de la narración de un texto"""
+        return len(text) / (self.chars_per_second * max(speaking_rate, 0.25))
+
+    def check(self, text: str, backlog_seconds: float, speaking_rate: float = 1.0) -> AdmissionDecision:
+        """Decidir si un texto entra en la cola de un servidor"""
+        estimate = self.estimate_seconds(text, speaking_rate)
+        if self.max_backlog_seconds <= 0 or backlog_seconds + estimate <= self.max_backlog_seconds:
+            return self._decide('accept', text, backlog_seconds)
+
+        if self.policy == 'summarize':
+            summary = self.summarize(text)
+            summary_estimate = self.estimate_seconds(summary, speaking_rate)
+            if summary and backlog_seconds + summary_estimate <= self.max_backlog_seconds:
+                self.seconds_shed += estimate - summary_estimate
+                return self._decide('summarize', summary, backlog_seconds)
+
+        self.seconds_shed += estimate
+        return self._decide('reject', '', backlog_seconds)
+
+    def summarize(self, text: str) -> str:
+        """Primera frase del texto, recortada a ``summary_chars`` en un límite de palabra"""
+        summary = SENTENCE_END_PATTERN.split(text.strip(), maxsplit=1)[0]
+        if len(summary) > self.summary_chars:
+            summary = summary[:self.summary_chars].rsplit(' ', 1)[0].rstrip(',;:')
+        return summary
+
+    def _decide(self, action: str, text: str, eta: float) -> AdmissionDecision:
+        self.decisions[action] += 1
+        return AdmissionDecision(action, text, eta)
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.decisions['accept'],
+            "summarized": self.decisions['summarize'],
+            "rejected": self.decisions['reject'],
+            "seconds_shed": self.seconds_shed
+        }
@@ -0,0 +1,67 @@
+import io
+import logging
+import wave
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+OPUS_SAMPLE_RATE = 48000
+
+# Bitrates de MPEG Layer III en kbps por índice: (MPEG-1, MPEG-2/2.5)
+MP3_BITRATES = (
+    (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+)
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def audio_duration(data: bytes, audio_encoding: str) -> Optional[float]:
+    """Duración en segundos de un audio de Google TTS leída de sus cabeceras.
+
+    LINEAR16 (WAV) usa la cabecera RIFF, OGG_OPUS la posición de la última
+    página Ogg menos el pre-skip y MP3 la cabecera de la primera trama
+    (Google TTS genera MP3 a bitrate constante). Devuelve None si no se puede
+    determinar.
+    """
+    try:
+        if audio_encoding == 'LINEAR16':
+            return _wav_duration(data)
+        if audio_encoding == 'OGG_OPUS':
+            return _ogg_opus_duration(data)
+        if audio_encoding == 'MP3':
+            return _mp3_duration(data)
+    except Exception as e:
+        logger.debug(f"No se pudo leer la duración del audio ({audio_encoding}): {str(e)}")
+    return None
+
+def _wav_duration(data: bytes) -> float:
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        return wav.getnframes() / wav.getframerate()
+
+def _ogg_opus_duration(data: bytes) -> Optional[float]:
+    head = data.find(b'OpusHead')
+    last_page = data.rfind(b'OggS')
+    if head < 0 or last_page < 0:
+        return None
+    pre_skip = int.from_bytes(data[head + 10:head + 12], 'little')
+    granule = int.from_bytes(data[last_page + 6:last_page + 14], 'little')
+    return max(0, granule - pre_skip) / OPUS_SAMPLE_RATE
+
+def _mp3_duration(data: bytes) -> Optional[float]:
+    offset = 0
+    if data[:3] == b'ID3':
+        # Tamaño de la etiqueta ID3v2 en enteros "syncsafe" de 7 bits
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset = 10 + size
+
+    while offset + 4 <= len(data):
+        if data[offset] == 0xFF and data[offset + 1] & 0xE0 == 0xE0:
+            version = (data[offset + 1] >> 3) & 0x03
+            bitrate_index = data[offset + 2] >> 4
+            rate_index = (data[offset + 2] >> 2) & 0x03
+            if version != 1 and 0 < bitrate_index < 15 and rate_index < 3:
+                bitrate = MP3_BITRATES[0 if version == 3 else 1][bitrate_index] * 1000
+                return (len(data) - offset) * 8 / bitrate
+        offset += 1
+    return None
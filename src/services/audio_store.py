@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class AudioArtifact:
+    path: str
+    size: int
+    created: float
+    refcount: int = 0
+    last_used: float = 0.0
+    cache_key: Optional[str] = None
+    duration: float = 0.0  # segundos, leídos de las cabeceras al sintetizar
+
+class AudioArtifactStore:
+    """Índice en memoria de los archivos de audio generados.
+
+    Cada archivo tiene un contador de referencias (una por elemento en cola
+    que lo usa). Al liberarse la última referencia el archivo se elimina,
+    salvo que esté en la caché de audio (``cache_key``): esos quedan en disco
+    para reutilizarse. El janitor aplica la cuota de bytes y la edad máxima
+    sin uso usando solo el índice, sin recorrer el directorio.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float,
+                 janitor_interval: float = 60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        self.total_bytes = 0
+        self.removed_files = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._artifacts: Dict[str, AudioArtifact] = {}
+        self._cache: Dict[str, str] = {}  # cache_key -> path
+        self._janitor_task: Optional[asyncio.Task] = None
+
+    def register(self, path: str, size: int, refs: int = 1,
+                 cache_key: Optional[str] = None, duration: float = 0.0) -> AudioArtifact:
+        """Registrar un archivo recién generado con ``refs`` referencias.
+
+        Con ``cache_key`` el archivo queda en la caché de audio y se conserva
+        sin referencias hasta que el janitor lo expulse.
+        """
+        now = time.time()
+        artifact = AudioArtifact(path=path, size=size, created=now, refcount=refs,
+                                 last_used=now, cache_key=cache_key, duration=duration)
+        previous = self._artifacts.get(path)
+        if previous is not None:
+            self.total_bytes -= previous.size
+        self._artifacts[path] = artifact
+        self.total_bytes += size
+
+        if cache_key is not None:
+            # Dos síntesis simultáneas del mismo texto: la anterior sale de la caché
+            replaced = self._artifacts.get(self._cache.get(cache_key, path))
+            if replaced is not None and replaced is not artifact:
+                replaced.cache_key = None
+                if replaced.refcount == 0:
+                    self._remove(replaced)
+            self._cache[cache_key] = path
+        return artifact
+
+    def lookup(self, cache_key: str) -> Optional[str]:
+        """Buscar audio en caché; si existe se suma una referencia y se devuelve su ruta"""
+        path = self._cache.get(cache_key)
+        if path is None or not self.acquire(path):
+            self.cache_misses += 1
+            return None
+        self.cache_hits += 1
+        return path
+
+    def contains(self, cache_key: str) -> bool:
+        """Comprobar si hay audio en caché sin tomar una referencia"""
+        return cache_key in self._cache
+
+    def get(self, path: str) -> Optional[AudioArtifact]:
+        return self._artifacts.get(path)
+
+    def acquire(self, path: str) -> bool:
+        """Sumar una referencia a un archivo existente"""
+        artifact = self._artifacts.get(path)
+        if artifact is None:
+            return False
+        artifact.refcount += 1
+        artifact.last_used = time.time()
+        return True
+
+    def release(self, path: str):
+        """Liberar una referencia; sin referencias el archivo se elimina"""
+        artifact = self._artifacts.get(path)
+        if artifact is None:
+            return
+        artifact.refcount = max(0, artifact.refcount - 1)
+        artifact.last_used = time.time()
+        if artifact.refcount == 0 and artifact.cache_key is None:
+            self._remove(artifact)
+
+    def _remove(self, artifact: AudioArtifact):
+        self._artifacts.pop(artifact.path, None)
+        if artifact.cache_key is not None and self._cache.get(artifact.cache_key) == artifact.path:
+            del self._cache[artifact.cache_key]
+        self.total_bytes -= artifact.size
+        try:
+            os.remove(artifact.path)
+            self.removed_files += 1
+            logger.debug(f"Archivo eliminado: {artifact.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error al eliminar archivo {artifact.path}: {str(e)}")
+
+    def enforce_limits(self) -> int:
+        """Eliminar archivos sin referencias que superen la edad o la cuota"""
+        now = time.time()
+        removed = 0
+
+        # Edad máxima sin uso
+        for artifact in list(self._artifacts.values()):
+            if artifact.refcount == 0 and now - artifact.last_used > self.max_age:
+                self._remove(artifact)
+                removed += 1
+
+        # Cuota total, empezando por los menos usados recientemente
+        if self.total_bytes > self.max_bytes:
+            candidates = sorted(
+                (a for a in self._artifacts.values() if a.refcount == 0),
+                key=lambda a: a.last_used
+            )
+            for artifact in candidates:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self._remove(artifact)
+                removed += 1
+
+        if self.total_bytes > self.max_bytes:
+            logger.warning(
+                f"Cuota de audio excedida por archivos en uso: "
+                f"{self.total_bytes} / {self.max_bytes} bytes"
+            )
+        return removed
+
+    def reconcile(self) -> int:
+        """Eliminar, en una sola pasada, los archivos que no están en el índice"""
+        removed = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.is_file() or entry.path in self._artifacts:
+                        continue
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except Exception as e:
+                        logger.warning(f"Error al eliminar archivo huérfano {entry.path}: {str(e)}")
+        except FileNotFoundError:
+            os.makedirs(self.directory, exist_ok=True)
+        if removed:
+            logger.info(f"Archivos de audio huérfanos eliminados: {removed}")
+        return removed
+
+    def start_janitor(self):
+        """Iniciar la tarea de limpieza periódica"""
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._janitor())
+
+    def stop_janitor(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            self._janitor_task = None
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(self.janitor_interval)
+            try:
+                removed = self.enforce_limits()
+                if removed:
+                    logger.debug(f"Janitor de audio: {removed} archivos eliminados")
+            except Exception as e:
+                logger.error(f"Error en limpieza de archivos: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._artifacts),
+            "total_bytes": self.total_bytes,
+            "referenced": sum(1 for a in self._artifacts.values() if a.refcount > 0),
+            "cached": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "removed_files": self.removed_files
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+from typing import Deque, Optional
+import discord
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = discord.opus.Encoder.SAMPLING_RATE
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE  # 20 ms de PCM estéreo 16 bits
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+SILENCE = b'\x00' * FRAME_SIZE
+
+def mono_to_stereo(data: bytes) -> bytes:
+    """Duplicar cada muestra PCM de 16 bits en los dos canales"""
+    samples = array('h')
+    samples.frombytes(data)
+    stereo = array('h', bytes(len(data) * 2))
+    stereo[0::2] = samples
+    stereo[1::2] = samples
+    return stereo.tobytes()
+
+class WavClipReader:
+    """Lectura directa de WAV PCM 16 bits a 48 kHz, sin procesos externos.
+
+    Con ``data`` se lee de ese buffer en memoria en lugar del archivo.
+    """
+
+    def __init__(self, path: str, data: Optional[bytes] = None):
+        self._wav = wave.open(io.BytesIO(data) if data is not None else path, 'rb')
+        try:
+            if (self._wav.getframerate() != SAMPLE_RATE
+                    or self._wav.getsampwidth() != 2
+                    or self._wav.getnchannels() not in (1, 2)):
+                raise ValueError("Formato WAV no soportado para reproducción directa")
+        except Exception:
+            self._wav.close()
+            raise
+        self._mono = self._wav.getnchannels() == 1
+
+    def read(self) -> bytes:
+        data = self._wav.readframes(SAMPLES_PER_FRAME)
+        return mono_to_stereo(data) if self._mono else data
+
+    def close(self):
+        self._wav.close()
+
+class FFmpegClipReader:
+    """Decodificación con ffmpeg para formatos que no son WAV a 48 kHz.
+
+    Lanza un proceso ffmpeg por clip, con su coste de arranque entre clips;
+    solo AUDIO_FORMAT=wav evita los procesos y los huecos.
+    """
+
+    def __init__(self, path: str):
+        self._source = discord.FFmpegPCMAudio(path)
+
+    def read(self) -> bytes:
+        return self._source.read()
+
+    def close(self):
+        self._source.cleanup()
+
+def open_clip_reader(path: str, data: Optional[bytes] = None):
+    """Abrir el lector más barato disponible para un archivo de audio"""
+    if path.endswith('.wav'):
+        try:
+            return WavClipReader(path, data)
+        except Exception as e:
+            logger.debug(f"Reproduciendo {path} con ffmpeg: {str(e)}")
+    return FFmpegClipReader(path)
+
+class Clip:
+    """Archivo de audio enviado al stream continuo.
+
+    ``done`` se resuelve en el event loop con ``(estado, error)`` cuando el
+    clip termina, falla o se descarta. ``data`` es el contenido del archivo
+    ya en memoria, compartido entre los clips de un fan-out.
+    """
+
+    def __init__(self, path: str, loop: asyncio.AbstractEventLoop, data: Optional[bytes] = None):
+        self.path = path
+        self.data = data
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._loop = loop
+        self.done: asyncio.Future = loop.create_future()
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    def finish(self, status: str, error: Optional[Exception] = None):
+        """Marcar el clip como terminado (seguro desde cualquier hilo)"""
+        if self.finished_at is None:
+            self.finished_at = time.perf_counter()
+        try:
+            self._loop.call_soon_threadsafe(self._resolve, status, error)
+        except RuntimeError:
+            # El event loop ya se cerró (apagado del bot)
+            pass
+
+    def _resolve(self, status: str, error: Optional[Exception]):
+        if not self.done.done():
+            self.done.set_result((status, error))
+
+class ContinuousAudioSource(discord.AudioSource):
+    """AudioSource de larga duración alimentado desde la cola.
+
+    Se reproduce una sola vez por conexión de voz: entrega los clips uno
+    detrás de otro cambiando entre ellos en límites de trama (20 ms), y
+    emite silencio mientras no hay nada que reproducir.
+    """
+
+    def __init__(self):
+        self._pending: Deque[Clip] = deque()
+        self._lock = threading.Lock()
+        self._current: Optional[Clip] = None
+        self._reader = None
+        self._closed = False
+
+    def submit(self, clip: Clip):
+        """Agregar un clip al final del stream"""
+        with self._lock:
+            if self._closed:
+                clip.finish("error", RuntimeError("El stream de audio está cerrado"))
+                return
+            self._pending.append(clip)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending) + (1 if self._current else 0)
+
+    def clear_pending(self) -> int:
+        """Descartar los clips que aún no empezaron a sonar"""
+        with self._lock:
+            cleared = list(self._pending)
+            self._pending.clear()
+        for clip in cleared:
+            clip.finish("cleared")
+        return len(cleared)
+
+    def read(self) -> bytes:
+        while True:
+            if self._reader is None and not self._start_next_clip():
+                return SILENCE
+
+            try:
+                frame = self._reader.read()
+            except Exception as e:
+                logger.error(f"Error leyendo audio {self._current.path}: {str(e)}")
+                self._end_current("error", e)
+                continue
+
+            if len(frame) == FRAME_SIZE:
+                return frame
+
+            # Fin del clip: completar la última trama con silencio
+            self._end_current("ok")
+            if frame:
+                return frame + SILENCE[len(frame):]
+
+    def _start_next_clip(self) -> bool:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return False
+                clip = self._pending.popleft()
+                self._current = clip
+            try:
+                self._reader = open_clip_reader(clip.path, clip.data)
+            except Exception as e:
+                logger.error(f"Error abriendo audio {clip.path}: {str(e)}")
+                self._end_current("error", e)
+                continue
+            clip.started_at = time.perf_counter()
+            return True
+
+    def _end_current(self, status: str, error: Optional[Exception] = None):
+        if self._reader is not None:
+            try:
+                self._reader.close()
+            except Exception:
+                pass
+            self._reader = None
+        with self._lock:
+            clip, self._current = self._current, None
+        if clip is not None:
+            clip.finish(status, error)
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        """Cerrar el stream y fallar los clips que quedaron pendientes"""
+        error = RuntimeError("Stream de audio detenido")
+        self._end_current("error", error)
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending)
+            self._pending.clear()
+        for clip in pending:
+            clip.finish("error", error)
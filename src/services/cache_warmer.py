@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from models.stats import Database
+from services.router import ChannelRouter, ChannelRoute
+from services.translator import TranslationService
+from services.tts import TTSService
+from services.usage_ledger import TIER_NORMAL
+
+logger = logging.getLogger(__name__)
+
+# Candidato de precalentamiento: (veces usado, tipo, clave, canal)
+Candidate = Tuple[int, str, str, Optional[ChannelRoute]]
+
+class CacheWarmer:
+    """Precalentar las cachés de audio y traducción con el historial.
+
+    Ordena por frecuencia los textos recientes de ``tts_stats`` y las
+    plantillas de ``translation_stats`` y los sintetiza o traduce en segundo
+    plano, sin superar ``budget`` llamadas a la API por pasada. Empieza
+    después de que el bot esté listo, así que no retrasa el arranque.
+    """
+
+    def __init__(self, db: Database, tts: TTSService, translator: TranslationService,
+                 router: ChannelRouter, budget: int, lookback_hours: float,
+                 min_count: int = 2, interval: float = 0.0):
+        self.db = db
+        self.tts = tts
+        self.translator = translator
+        self.router = router
+        self.budget = budget
+        self.lookback_hours = lookback_hours
+        self.min_count = min_count
+        self.interval = interval
+        self.runs = 0
+        self.api_calls = 0
+        self.warmed_audio = 0
+        self.warmed_translations = 0
+        self.failures = 0
+        self.last_run: Optional[datetime] = None
+        self.last_duration = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot):
+        """Iniciar la tarea de precalentamiento; espera a que el bot esté listo"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever(bot))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_forever(self, bot):
+        await bot.wait_until_ready()
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error en precalentamiento de cachés: {str(e)}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Ejecutar una pasada de precalentamiento; devuelve las llamadas a la API usadas"""
+        ledger = self.tts.usage_ledger
+        if ledger is not None and ledger.tier() > TIER_NORMAL:
+            # No gastar presupuesto de Google en especulación cuando ya escasea
+            logger.info("Precalentamiento omitido: presupuesto de Google casi agotado")
+            return 0
+        start = time.perf_counter()
+        since = datetime.utcnow() - timedelta(hours=self.lookback_hours)
+        candidates = await asyncio.to_thread(self._rank_candidates, since)
+
+        calls = 0
+        for count, kind, key, route in candidates:
+            if calls >= self.budget:
+                break
+            if kind == 'tts' and self._audio_store_full():
+                continue
+            try:
+                if kind == 'tts':
+                    called = await self.tts.warm(
+                        key,
+                        voice_name=route.voice_name if route else None,
+                        language_code=route.language_code if route else None
+                    )
+                    self.warmed_audio += called
+                else:
+                    called = await self.translator.warm(key, route.source_language, route.target_language)
+                    self.warmed_translations += called
+            except Exception as e:
+                # Un fallo también consume presupuesto
+                called = True
+                self.failures += 1
+                logger.warning(f"Error precalentando {kind}: {str(e)}")
+            calls += called
+
+        self.runs += 1
+        self.api_calls += calls
+        self.last_run = datetime.utcnow()
+        self.last_duration = time.perf_counter() - start
+        logger.info(
+            f"Precalentamiento de cachés: {calls}/{self.budget} llamadas, "
+            f"{len(candidates)} candidatos, {self.last_duration:.1f}s"
+        )
+        return calls
+
+    def _rank_candidates(self, since: datetime) -> List[Candidate]:
+        """Unir textos de TTS y plantillas de traducción ordenados por frecuencia"""
+        candidates: List[Candidate] = []
+
+        for channel_id, text, count in self.db.get_frequent_tts_texts(since, self.min_count):
+            if text:
+                candidates.append((count, 'tts', text, self._route(channel_id)))
+
+        templates: Counter = Counter()
+        for channel_id, text in self.db.get_recent_translations(since):
+            route = self._route(channel_id)
+            if text and route is not None and route.needs_translation:
+                templates[(self.translator.template(text), route.source_language,
+                           route.target_language)] += 1
+        routes_by_pair = {
+            (route.source_language, route.target_language): route
+            for route in self.router.routes() if route.needs_translation
+        }
+        for (template, source, target), count in templates.items():
+            if count >= self.min_count:
+                candidates.append((count, 'translate', template, routes_by_pair[(source, target)]))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates
+
+    def _route(self, channel_id: Optional[int]) -> Optional[ChannelRoute]:
+        return self.router.get(channel_id) if channel_id is not None else None
+
+    def _audio_store_full(self) -> bool:
+        store = self.tts.audio_store
+        return store is None or store.total_bytes >= store.max_bytes * 0.9
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "api_calls": self.api_calls,
+            "warmed_audio": self.warmed_audio,
+            "warmed_translations": self.warmed_translations,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration
+        }
@@ -0,0 +1,103 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Palabras funcionales muy frecuentes; bastan unas pocas por mensaje para decidir el idioma.
+# Se excluyen las que existen en ambos idiomas ("a", "he", "has")
+STOPWORDS = {
+    'es': frozenset({
+        'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'de', 'del', 'al', 'y', 'o',
+        'que', 'en', 'por', 'para', 'con', 'sin', 'se', 'su', 'sus', 'es', 'son', 'está',
+        'están', 'esta', 'este', 'esto', 'pero', 'más', 'muy', 'ya', 'hay', 'como', 'cuando',
+        'lo', 'le', 'les', 'me', 'mi', 'nos', 'no', 'sí', 'si', 'fue', 'ser', 'estar', 'tiene',
+        'hoy', 'ahora', 'todo', 'todos', 'bien', 'también', 'porque', 'desde', 'hasta', 'entre',
+        'sobre', 'compra', 'venta', 'subida', 'bajada', 'cierre', 'apertura'
+    }),
+    'en': frozenset({
+        'the', 'an', 'of', 'and', 'or', 'to', 'in', 'on', 'for', 'with', 'without', 'is',
+        'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'these', 'those', 'but',
+        'more', 'very', 'already', 'there', 'as', 'when', 'we', 'you', 'she', 'they', 'i',
+        'my', 'our', 'not', 'yes', 'have', 'had', 'will', 'would', 'today', 'now', 'all',
+        'well', 'also', 'because', 'from', 'until', 'between', 'about', 'buy', 'sell', 'up',
+        'down', 'close', 'open', 'at', 'just', 'going', 'looks', 'like'
+    })
+}
+
+# Caracteres que solo aparecen en español frente al inglés
+SPANISH_MARKERS = frozenset('áéíóúñü¿¡')
+
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+
+@dataclass
+class FilterDecision:
+    translate: bool
+    reason: str
+
+class TranslationPreFilter:
+    """Clasificador local que decide si un mensaje necesita Google Translate.
+
+    Reutiliza los elementos extraídos por el tokenizador de preservación
+    (tickers, números, menciones, emojis) y, sobre el texto restante, cuenta
+    palabras funcionales de cada idioma. Ante la duda, traduce.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.calls_saved = 0
+        self.chars_saved = 0
+        self.reasons: Counter = Counter()
+
+    def classify(self, text: str, preserved_items: List[Tuple[str, str, int]],
+                 source_language: str, target_language: str) -> FilterDecision:
+        """Decidir si el texto tiene contenido traducible"""
+        self.checked += 1
+        words = self._remaining_words(text, preserved_items)
+
+        if not words:
+            decision = FilterDecision(False, 'sin_texto')
+        else:
+            decision = self._detect_language(words, source_language, target_language)
+
+        self.reasons[decision.reason] += 1
+        if not decision.translate:
+            self.calls_saved += 1
+            self.chars_saved += len(text)
+        return decision
+
+    def _remaining_words(self, text: str, preserved_items: List[Tuple[str, str, int]]) -> List[str]:
+        # Borrar los tramos preservados por el tokenizador y las URLs
+        chars = list(text)
+        for original, _, start in preserved_items:
+            for i in range(start, min(start + len(original), len(chars))):
+                chars[i] = ' '
+        remaining = URL_PATTERN.sub(' ', ''.join(chars))
+        return WORD_PATTERN.findall(remaining.lower())
+
+    def _detect_language(self, words: List[str], source_language: str,
+                         target_language: str) -> FilterDecision:
+        source_words = STOPWORDS.get(source_language)
+        target_words = STOPWORDS.get(target_language)
+        if source_words is None or target_words is None:
+            return FilterDecision(True, 'idioma_sin_modelo')
+
+        source_hits = sum(1 for word in words if word in source_words)
+        target_hits = sum(1 for word in words if word in target_words)
+        if source_language == 'es' and any(ch in SPANISH_MARKERS for word in words for ch in word):
+            source_hits += 1
+
+        if source_hits == 0 and (target_hits >= 2 or target_hits / len(words) >= 0.3):
+            return FilterDecision(False, 'ya_traducido')
+        if source_hits == 0 and target_hits == 0 and len(words) <= 2 and all(len(word) <= 2 for word in words):
+            # Interjecciones o siglas sueltas ("ok", "go")
+            return FilterDecision(False, 'sin_texto')
+        return FilterDecision(True, 'traducir')
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "calls_saved": self.calls_saved,
+            "chars_saved": self.chars_saved,
+            "reasons": dict(self.reasons)
+        }
@@ -1,10 +1,10 @@
 import time
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import sqlite3
-from utils.config import Config
+from utils.config import get_config
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,9 @@ class VoiceMetrics:
     unexpected_disconnections: int = 0
     total_audio_time: float = 0.0
     last_connection_time: float = 0.0
+    channel_switches: int = 0
+    total_switch_time: float = 0.0
+    switches_avoided: int = 0
 
 @dataclass
 class AudioMetrics:
@@ -26,11 +29,20 @@ class AudioMetrics:
     average_queue_time: float = 0.0
     queue_times: List[float] = field(default_factory=list)
 
+@dataclass
+class FanoutMetrics:
+    deliveries: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
 class MetricsManager:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self.voice_metrics: Dict[int, VoiceMetrics] = {}
         self.audio_metrics: Dict[int, AudioMetrics] = {}
+        self.usage_tier_changes = 0
+        self.fanout_metrics: Dict[Tuple[int, int], FanoutMetrics] = {}
         self.db_path = self.config.DB_PATH
         self._setup_database()
 
@@ -82,6 +94,23 @@ class MetricsManager:
             metrics.total_audio_time += session_duration
             self._save_metric(guild_id, "voice", "session_duration", session_duration)
 
+    def record_voice_channel_switch(self, guild_id: int, duration: float):
+        """Registrar un cambio de canal de voz sin reconexión"""
+        if guild_id not in self.voice_metrics:
+            self.voice_metrics[guild_id] = VoiceMetrics()
+
+        metrics = self.voice_metrics[guild_id]
+        metrics.channel_switches += 1
+        metrics.total_switch_time += duration
+        self._save_metric(guild_id, "voice", "channel_switch", duration)
+
+    def record_voice_switch_avoided(self, guild_id: int):
+        """Registrar un clip adelantado para no cambiar de canal de voz"""
+        if guild_id not in self.voice_metrics:
+            self.voice_metrics[guild_id] = VoiceMetrics()
+
+        self.voice_metrics[guild_id].switches_avoided += 1
+
     def record_audio_queued(self, guild_id: int):
         """Registrar audio agregado a la cola"""
         if guild_id not in self.audio_metrics:
@@ -116,6 +145,39 @@ class MetricsManager:
         if success:
             self._save_metric(guild_id, "audio", "duration", duration)
 
+    def record_usage_tier(self, previous: int, tier: int):
+        """Registrar un cambio del nivel de degradación por presupuesto de Google (global)"""
+        self.usage_tier_changes += 1
+        self._save_metric(0, "usage", "tier", tier)
+
+    def record_fanout_delivery(self, guild_id: int, voice_channel_id: int, success: bool,
+                               latency: Optional[float]):
+        """Registrar la entrega de un audio de fan-out a un destino (latencia desde la llegada del mensaje)"""
+        metrics = self.fanout_metrics.setdefault((guild_id, voice_channel_id), FanoutMetrics())
+        if success:
+            metrics.deliveries += 1
+            if latency is not None:
+                metrics.total_latency += latency
+                metrics.max_latency = max(metrics.max_latency, latency)
+                self._save_metric(guild_id, "fanout", "latency", latency)
+        else:
+            metrics.failures += 1
+            self._save_metric(guild_id, "fanout", "failed", 1)
+
+    def get_fanout_stats(self) -> List[dict]:
+        """Entregas, fallos y latencias por destino de fan-out"""
+        return [
+            {
+                "guild_id": guild_id,
+                "voice_channel_id": voice_channel_id,
+                "deliveries": metrics.deliveries,
+                "failures": metrics.failures,
+                "average_latency": metrics.total_latency / metrics.deliveries if metrics.deliveries else 0.0,
+                "max_latency": metrics.max_latency
+            }
+            for (guild_id, voice_channel_id), metrics in self.fanout_metrics.items()
+        ]
+
     def get_guild_stats(self, guild_id: int) -> dict:
         """Obtener estadísticas para un servidor"""
         voice_metrics = self.voice_metrics.get(guild_id, VoiceMetrics())
@@ -132,7 +194,13 @@ class MetricsManager:
                     voice_metrics.unexpected_disconnections
                     / voice_metrics.total_disconnections * 100 if voice_metrics.total_disconnections > 0 else 0
                 ),
-                "total_audio_time": str(timedelta(seconds=int(voice_metrics.total_audio_time)))
+                "total_audio_time": str(timedelta(seconds=int(voice_metrics.total_audio_time))),
+                "channel_switches": voice_metrics.channel_switches,
+                "average_switch_time": (
+                    voice_metrics.total_switch_time / voice_metrics.channel_switches
+                    if voice_metrics.channel_switches > 0 else 0
+                ),
+                "switches_avoided": voice_metrics.switches_avoided
             },
             "audio": {
                 "total_queued": audio_metrics.total_queued,
@@ -1,104 +1,390 @@
 import asyncio
 import discord
 from collections import deque
+from dataclasses import dataclass, field
 import logging
 import time
-from typing import Optional, Deque, Tuple
-from utils.config import Config
+from typing import Dict, Optional, Deque, Sequence, Tuple
+from services.audio_stream import Clip, ContinuousAudioSource
+from utils.config import get_config
+from utils.tracing import Span, Trace, traced
 
 logger = logging.getLogger(__name__)
 
+# Clips enviados al stream por adelantado para que el cambio entre clips no tenga huecos
+PREFETCH_CLIPS = 2
+
+@dataclass
+class FanoutDelivery:
+    """Entrega de un mismo audio a varios destinos; la traza se cierra con el último"""
+    targets: int
+    trace: Optional[Trace] = None
+    started: float = field(default_factory=time.perf_counter)
+    pending: int = 0
+    failures: int = 0
+
+    def __post_init__(self):
+        self.pending = self.targets
+
+@dataclass
+class BacklogReservation:
+    """Segundos estimados de una narración admitida que aún no está en la cola"""
+    seconds: Dict[int, float] = field(default_factory=dict)  # guild_id -> segundos
+
+@dataclass
+class QueueItem:
+    audio_file: str
+    author: discord.Member
+    voice_channel_id: Optional[int] = None
+    trace: Optional[Trace] = None
+    wait_span: Optional[Span] = None
+    clip: Optional[Clip] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    duration: float = 0.0
+    guild_id: Optional[int] = None
+    audio_data: Optional[bytes] = None
+    delivery: Optional[FanoutDelivery] = None
+
+@dataclass
+class GuildPlayback:
+    """Estado de reproducción de un servidor"""
+    queue: Deque[QueueItem] = field(default_factory=deque)
+    playing: Deque[QueueItem] = field(default_factory=deque)
+    source: Optional[ContinuousAudioSource] = None
+    task: Optional[asyncio.Task] = None
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    run_length: int = 0  # clips seguidos en el canal actual con otros canales esperando
+    backlog_seconds: float = 0.0  # duración total de los elementos en cola y en el stream
+    reserved_seconds: float = 0.0  # narraciones admitidas que aún se traducen o sintetizan
+
 class AudioQueueManager:
     def __init__(self, bot):
-        self.queue: Deque[Tuple[str, discord.Member]] = deque()
-        self.current_audio: Optional[str] = None
-        self.is_playing = False
-        self.config = Config()
-        self._lock = asyncio.Lock()
+        self.guilds: Dict[int, GuildPlayback] = {}
+        self.config = get_config()
         self.bot = bot
         self.reconnection_attempts = {}
-        self._audio_start_time = 0
-        
-    async def add_to_queue(self, audio_file: str, author: discord.Member):
-        """Agregar archivo de audio a la cola"""
-        async with self._lock:
-            self.queue.append((audio_file, author))
-            logger.debug(f"Audio agregado a la cola: {audio_file}")
-            
-            # Registrar audio en cola
-            self.bot.metrics_manager.record_audio_queued(author.guild.id)
-            
-            if not self.is_playing:
-                await self._process_queue(author.guild)
-                
-    async def _process_queue(self, guild: discord.Guild):
-        """Procesar la cola de audio"""
-        if self.is_playing:
+        self.pinned_channel_id = int(self.config.VOICE_CHANNEL_ID) if self.config.VOICE_CHANNEL_ID else None
+
+    def _state(self, guild_id: int) -> GuildPlayback:
+        state = self.guilds.get(guild_id)
+        if state is None:
+            state = self.guilds[guild_id] = GuildPlayback()
+        return state
+
+    def queue_size(self, guild_id: int) -> int:
+        """Elementos pendientes o en reproducción en un servidor"""
+        state = self.guilds.get(guild_id)
+        if state is None:
+            return 0
+        return len(state.queue) + len(state.playing)
+
+    def backlog_seconds(self, guild_id: int) -> float:
+        """Segundos de audio pendientes en un servidor (tiempo estimado de drenaje)"""
+        state = self.guilds.get(guild_id)
+        if state is None:
+            return 0.0
+        remaining = state.backlog_seconds
+        if state.playing:
+            # Descontar lo que ya sonó del clip actual
+            head = state.playing[0]
+            clip = head.clip
+            if clip is not None and clip.started_at is not None and clip.finished_at is None:
+                remaining -= min(time.perf_counter() - clip.started_at, head.duration)
+        return max(0.0, remaining)
+
+    def reserved_seconds(self, guild_id: int) -> float:
+        """Segundos estimados de narraciones admitidas que aún no llegan a la cola"""
+        state = self.guilds.get(guild_id)
+        return state.reserved_seconds if state is not None else 0.0
+
+    def reserve(self, guild_ids: Sequence[int], seconds: float) -> BacklogReservation:
+        """Reservar ``seconds`` por destino en cada servidor (un servidor repetido suma)"""
+        reservation = BacklogReservation()
+        for guild_id in guild_ids:
+            reservation.seconds[guild_id] = reservation.seconds.get(guild_id, 0.0) + seconds
+            self._state(guild_id).reserved_seconds += seconds
+        return reservation
+
+    def release(self, reservation: Optional[BacklogReservation], guild_id: Optional[int] = None):
+        """Liberar la reserva de un servidor (o de todos); liberar dos veces no tiene efecto"""
+        if reservation is None:
             return
-            
+        guild_ids = [guild_id] if guild_id is not None else list(reservation.seconds)
+        for gid in guild_ids:
+            seconds = reservation.seconds.pop(gid, 0.0)
+            state = self.guilds.get(gid)
+            if state is not None and seconds:
+                state.reserved_seconds = max(0.0, state.reserved_seconds - seconds)
+
+    async def add_to_queue(self, audio_file: str, author: discord.Member,
+                           trace: Optional[Trace] = None, voice_channel_id: Optional[int] = None,
+                           guild: Optional[discord.Guild] = None, audio_data: Optional[bytes] = None,
+                           delivery: Optional[FanoutDelivery] = None,
+                           reservation: Optional[BacklogReservation] = None):
+        """Agregar archivo de audio a la cola.
+
+        Si se indica ``voice_channel_id`` se reproduce en ese canal de voz;
+        si no, en el canal de voz actual del autor. ``guild`` permite encolar
+        en un servidor distinto al del autor (fan-out). La reserva de
+        ``reservation`` en el servidor se sustituye por la duración real.
+        """
+        guild = guild or author.guild
+        state = self._state(guild.id)
+        wait_span = trace.start_span("queue_wait", depth=self.queue_size(guild.id)) if trace else None
+        artifact = self.bot.audio_store.get(audio_file)
+        duration = artifact.duration if artifact else 0.0
+        state.queue.append(QueueItem(
+            audio_file, author, voice_channel_id, trace, wait_span, duration=duration,
+            guild_id=guild.id, audio_data=audio_data, delivery=delivery
+        ))
+        state.backlog_seconds += duration
+        self.release(reservation, guild.id)
+        logger.debug(f"Audio agregado a la cola: {audio_file} ({duration:.1f}s)")
+
+        # Registrar audio en cola
+        self.bot.metrics_manager.record_audio_queued(guild.id)
+
+        # La reproducción corre en una tarea propia del servidor
+        state.wakeup.set()
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._process_queue(guild, state))
+
+    async def fan_out(self, audio_file: str, author: discord.Member,
+                      targets: Sequence[Tuple[int, int]], trace: Optional[Trace] = None,
+                      reservation: Optional[BacklogReservation] = None) -> int:
+        """Encolar un mismo audio en varios destinos (guild_id, voice_channel_id).
+
+        El archivo recibe una referencia por destino (consume la referencia
+        inicial) y los clips WAV leen del mismo buffer en memoria. Cada
+        servidor reproduce con su propia tarea, así que los destinos de
+        servidores distintos suenan a la vez; varios canales de un mismo
+        servidor se reproducen uno detrás de otro. Devuelve los destinos encolados.
+        """
+        audio_data = None
+        if audio_file.endswith('.wav'):
+            try:
+                audio_data = await asyncio.to_thread(self._read_audio, audio_file)
+            except OSError as e:
+                logger.warning(f"Fan-out leyendo {audio_file} desde disco: {str(e)}")
+
+        delivery = FanoutDelivery(len(targets), trace, started=trace.start if trace else time.perf_counter())
+        # Referencias para todos los destinos antes de encolar, por si alguno falla enseguida
+        for _ in range(len(targets) - 1):
+            self.bot.audio_store.acquire(audio_file)
+
+        queued = 0
+        for guild_id, voice_channel_id in targets:
+            guild = self.bot.get_guild(guild_id)
+            try:
+                if guild is None:
+                    raise LookupError(f"servidor {guild_id} no disponible")
+                await self.add_to_queue(audio_file, author, trace, voice_channel_id, guild=guild,
+                                        audio_data=audio_data, delivery=delivery, reservation=reservation)
+                queued += 1
+            except Exception as e:
+                logger.error(f"Error encolando fan-out en {guild_id}/{voice_channel_id}: {str(e)}")
+                self.release(reservation, guild_id)
+                self.bot.audio_store.release(audio_file)
+                self._finish_delivery(delivery, guild_id, voice_channel_id, None, "fanout_error")
+        self.release(reservation)
+        return queued
+
+    @staticmethod
+    def _read_audio(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def _process_queue(self, guild: discord.Guild, state: GuildPlayback):
+        """Reproducir la cola de un servidor a través del stream continuo"""
         try:
-            self.is_playing = True
-            
-            while self.queue:
-                audio_file, author = self.queue[0]
-                
-                # Verificar si el autor está en un canal de voz
-                if not author.voice:
-                    logger.warning(f"Usuario {author.name} no está en un canal de voz")
-                    self.queue.popleft()
-                    continue
-                    
-                voice_channel = author.voice.channel
-                
-                # Conectar al canal de voz si no está conectado
-                if not guild.voice_client:
-                    try:
-                        await self._connect_to_voice(voice_channel, guild)
-                    except Exception as e:
-                        logger.error(f"Error al conectar al canal de voz: {str(e)}")
-                        self.bot.metrics_manager.record_voice_connection(guild.id, False)
-                        self.queue.popleft()
-                        continue
-                        
-                # Reproducir audio
+            while True:
+                while state.queue or state.playing:
+                    await self._fill_stream(guild, state)
+                    if state.playing:
+                        await self._wait_clip(guild, state)
+
+                # Mantener la conexión un tiempo por si llega más audio
+                state.wakeup.clear()
                 try:
-                    self.current_audio = audio_file
-                    self._audio_start_time = time.time()
-                    
-                    # Asegurarnos de usar el loop correcto
-                    loop = self.bot.loop if hasattr(self.bot, 'loop') else asyncio.get_event_loop()
-                    
-                    guild.voice_client.play(
-                        discord.FFmpegPCMAudio(audio_file),
-                        after=lambda e: asyncio.run_coroutine_threadsafe(
-                            self._song_finished(e, guild),
-                            loop
-                        )
-                    )
-                    
-                    # Esperar a que termine la reproducción
-                    while guild.voice_client and guild.voice_client.is_playing():
-                        await asyncio.sleep(0.1)
-                        
-                except Exception as e:
-                    logger.error(f"Error reproduciendo audio: {str(e)}")
-                    await self._handle_playback_error(guild, e)
-                    
-                finally:
-                    if self.queue:
-                        self.queue.popleft()
-                    self.current_audio = None
-                    
+                    await asyncio.wait_for(state.wakeup.wait(), timeout=self.config.VOICE_IDLE_TIMEOUT)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+                if not state.queue:
+                    await self._disconnect(guild, state)
+                    # add_to_queue no crea otra tarea mientras ésta sigue viva:
+                    # lo encolado durante la desconexión se reproduce aquí
+                    if not state.queue:
+                        return
+
         except Exception as e:
             logger.error(f"Error procesando cola: {str(e)}")
-            
-        finally:
-            self.is_playing = False
-            
+
+    async def _fill_stream(self, guild: discord.Guild, state: GuildPlayback):
+        """Enviar al stream los próximos elementos de la cola"""
+        while state.queue and len(state.playing) < PREFETCH_CLIPS:
+            index, voice_channel = self._select_next(guild, state)
+            item = state.queue[index]
+
+            if voice_channel is None:
+                logger.warning(f"Usuario {item.author.name} no está en un canal de voz")
+                del state.queue[index]
+                self._finish_item(item, "no_voice")
+                continue
+
+            voice_client = guild.voice_client
+            if voice_client and voice_client.channel and voice_client.channel.id != voice_channel.id:
+                # Cambiar de canal solo cuando termina lo que ya suena en el actual
+                if state.playing:
+                    break
+                try:
+                    with traced(item.trace, "voice_switch", channel_id=voice_channel.id):
+                        await self._switch_channel(voice_client, voice_channel, guild, state)
+                except Exception as e:
+                    logger.error(f"Error al cambiar de canal de voz: {str(e)}")
+                    del state.queue[index]
+                    self._finish_item(item, "voice_error")
+                    continue
+
+            # Conectar al canal de voz si no está conectado
+            elif not voice_client:
+                try:
+                    with traced(item.trace, "voice_connect", channel_id=voice_channel.id):
+                        await self._connect_to_voice(voice_channel, guild)
+                except Exception as e:
+                    logger.error(f"Error al conectar al canal de voz: {str(e)}")
+                    self.bot.metrics_manager.record_voice_connection(guild.id, False)
+                    del state.queue[index]
+                    self._finish_item(item, "voice_error")
+                    continue
+
+            try:
+                source = self._ensure_stream(guild, state)
+            except Exception as e:
+                logger.error(f"Error iniciando el stream de audio: {str(e)}")
+                self.bot.metrics_manager.record_audio_played(guild.id, False, 0)
+                del state.queue[index]
+                self._finish_item(item, "playback_error")
+                continue
+
+            if index > 0:
+                # Se adelantó un clip del canal actual a otros más antiguos
+                state.run_length += 1
+                self.bot.metrics_manager.record_voice_switch_avoided(guild.id)
+            else:
+                state.run_length = 0
+            del state.queue[index]
+            item.clip = Clip(item.audio_file, asyncio.get_running_loop(), item.audio_data)
+            source.submit(item.clip)
+            state.playing.append(item)
+
+    def _select_next(self, guild: discord.Guild, state: GuildPlayback) -> Tuple[int, Optional[discord.VoiceChannel]]:
+        """Elegir el próximo elemento agrupando por canal de voz.
+
+        Se adelantan los elementos del canal conectado para no saltar entre
+        canales, salvo que el más antiguo de otro canal supere
+        VOICE_BATCH_MAX_WAIT o que el canal actual ya haya encadenado
+        VOICE_BATCH_MAX_RUN clips adelantados.
+        """
+        first = state.queue[0]
+        first_channel = self._resolve_voice_channel(first, guild)
+        voice_client = guild.voice_client
+        current = voice_client.channel if voice_client else None
+
+        if current is None or first_channel is None or first_channel.id == current.id:
+            return 0, first_channel
+        if (time.monotonic() - first.enqueued_at >= self.config.VOICE_BATCH_MAX_WAIT
+                or state.run_length >= self.config.VOICE_BATCH_MAX_RUN):
+            return 0, first_channel
+
+        for index in range(1, len(state.queue)):
+            channel = self._resolve_voice_channel(state.queue[index], guild)
+            if channel is not None and channel.id == current.id:
+                return index, channel
+        return 0, first_channel
+
+    async def _switch_channel(self, voice_client: discord.VoiceClient, voice_channel: discord.VoiceChannel,
+                              guild: discord.Guild, state: GuildPlayback):
+        """Mover la conexión existente a otro canal de voz sin reconectar"""
+        start = time.perf_counter()
+        await voice_client.move_to(voice_channel)
+        self.bot.metrics_manager.record_voice_channel_switch(guild.id, time.perf_counter() - start)
+        logger.info(f"Movido al canal de voz: {voice_channel.name}")
+
+    async def _wait_clip(self, guild: discord.Guild, state: GuildPlayback):
+        """Esperar a que termine el clip más antiguo enviado al stream"""
+        item = state.playing[0]
+        status, error = await item.clip.done
+        if state.playing and state.playing[0] is item:
+            state.playing.popleft()
+
+        clip = item.clip
+        if item.trace and clip.started_at is not None:
+            if item.wait_span and not item.wait_span.end:
+                item.wait_span.end = clip.started_at
+            item.trace.add_span("playback", clip.started_at, clip.finished_at)
+
+        if status == "ok":
+            self.bot.metrics_manager.record_audio_played(guild.id, True, clip.duration)
+        elif status == "error":
+            logger.error(f"Error en reproducción: {str(error)}")
+            self.bot.metrics_manager.record_audio_played(guild.id, False, clip.duration)
+
+        self._finish_item(item, "playback_error" if status == "error" else status)
+
+    def _ensure_stream(self, guild: discord.Guild, state: GuildPlayback) -> ContinuousAudioSource:
+        """Obtener el stream de la conexión actual, iniciándolo si hace falta"""
+        voice_client = guild.voice_client
+        if state.source is not None and voice_client.source is state.source and voice_client.is_playing():
+            return state.source
+
+        # Un único play() por conexión; los clips se encadenan dentro del stream
+        state.source = ContinuousAudioSource()
+        voice_client.play(state.source, after=lambda e: self._stream_stopped(guild, e))
+        logger.debug(f"Stream de audio iniciado en {guild.name}")
+        return state.source
+
+    def _stream_stopped(self, guild: discord.Guild, error: Optional[Exception]):
+        """Callback (hilo de audio) cuando el stream de una conexión se detiene"""
+        if error:
+            logger.error(f"Stream de audio detenido por error en {guild.name}: {str(error)}")
+
+    async def _disconnect(self, guild: discord.Guild, state: GuildPlayback):
+        """Desconectar del canal de voz tras el tiempo de inactividad"""
+        state.source = None
+        if guild.voice_client:
+            try:
+                await guild.voice_client.disconnect()
+                self.bot.metrics_manager.record_voice_disconnection(guild.id, True)
+                logger.info("Desconectado del canal de voz - Cola vacía")
+            except Exception as e:
+                logger.error(f"Error al desconectar: {str(e)}")
+
+    def _resolve_voice_channel(self, item: QueueItem, guild: discord.Guild) -> Optional[discord.VoiceChannel]:
+        """Obtener el canal de voz destino de un elemento de la cola.
+
+        Prioridad: canal de la ruta, canal fijo VOICE_CHANNEL_ID (si es de este
+        servidor) y, por último, el canal de voz actual del autor.
+        """
+        if item.voice_channel_id:
+            channel = guild.get_channel(item.voice_channel_id)
+            if channel is not None:
+                return channel
+            logger.warning(f"Canal de voz {item.voice_channel_id} no encontrado")
+        if self.pinned_channel_id:
+            channel = guild.get_channel(self.pinned_channel_id)
+            if channel is not None:
+                return channel
+        # El canal de voz del autor solo sirve en su propio servidor (no en destinos de fan-out)
+        if item.author.voice and item.author.guild.id == guild.id:
+            return item.author.voice.channel
+        return None
+
     async def _connect_to_voice(self, voice_channel: discord.VoiceChannel, guild: discord.Guild, max_retries: int = 3):
         """Conectar al canal de voz con reintentos"""
         retries = self.reconnection_attempts.get(guild.id, 0)
-        
+
         while retries < max_retries:
             try:
                 await voice_channel.connect()
@@ -115,49 +401,47 @@ class AudioQueueManager:
                 else:
                     self.bot.metrics_manager.record_voice_connection(guild.id, False)
                     raise
-                    
-    async def _handle_playback_error(self, guild: discord.Guild, error: Exception):
-        """Manejar errores de reproducción"""
-        logger.error(f"Error en reproducción: {str(error)}")
-        
-        # Registrar error de reproducción
-        if self._audio_start_time > 0:
-            duration = time.time() - self._audio_start_time
-            self.bot.metrics_manager.record_audio_played(guild.id, False, duration)
-        
-        if guild.voice_client:
-            try:
-                await guild.voice_client.disconnect()
-                self.bot.metrics_manager.record_voice_disconnection(guild.id, False)
-                logger.info("Desconectado del canal de voz debido a error")
-            except Exception as e:
-                logger.error(f"Error al desconectar: {str(e)}")
-                
-        # Limpiar estado
-        self.is_playing = False
-        self.current_audio = None
-            
-    async def _song_finished(self, error, guild: discord.Guild):
-        """Callback para cuando termina la reproducción"""
-        duration = time.time() - self._audio_start_time if self._audio_start_time > 0 else 0
-        
-        if error:
-            logger.error(f"Error en reproducción: {str(error)}")
-            self.bot.metrics_manager.record_audio_played(guild.id, False, duration)
-            await self._handle_playback_error(guild, error)
+
+    def _finish_item(self, item: QueueItem, status: str):
+        """Liberar el audio de un elemento que sale de la cola y cerrar su traza"""
+        state = self.guilds.get(item.guild_id)
+        if state is not None:
+            state.backlog_seconds = max(0.0, state.backlog_seconds - item.duration)
+        self.bot.audio_store.release(item.audio_file)
+        if item.delivery is not None:
+            self._finish_delivery(item.delivery, item.guild_id, item.voice_channel_id, item.clip, status)
         else:
-            self.bot.metrics_manager.record_audio_played(guild.id, True, duration)
-            
-        # Desconectar si la cola está vacía
-        if not self.queue and guild.voice_client:
-            try:
-                await guild.voice_client.disconnect()
-                self.bot.metrics_manager.record_voice_disconnection(guild.id, True)
-                logger.info("Desconectado del canal de voz - Cola vacía")
-            except Exception as e:
-                logger.error(f"Error al desconectar: {str(e)}")
-            
-    def clear_queue(self):
-        """Limpiar la cola de reproducción"""
-        self.queue.clear()
-        logger.info("Cola de reproducción limpiada") 
\ No newline at end of file
+            self.bot.tracer.finish(item.trace, status)
+
+    def _finish_delivery(self, delivery: FanoutDelivery, guild_id: int, voice_channel_id: int,
+                         clip: Optional[Clip], status: str):
+        """Registrar el resultado de un destino de fan-out y cerrar la traza con el último"""
+        success = status == "ok"
+        latency = clip.started_at - delivery.started if clip is not None and clip.started_at is not None else None
+        self.bot.metrics_manager.record_fanout_delivery(guild_id, voice_channel_id, success, latency)
+        delivery.pending -= 1
+        if not success:
+            delivery.failures += 1
+        if delivery.pending == 0:
+            if not delivery.failures:
+                final_status = "ok"
+            else:
+                final_status = "partial" if delivery.failures < delivery.targets else status
+            self.bot.tracer.finish(delivery.trace, final_status)
+
+    def clear_queue(self, guild_id: Optional[int] = None):
+        """Limpiar la cola de reproducción (de un servidor o de todos)"""
+        guild_ids = [guild_id] if guild_id is not None else list(self.guilds)
+        for gid in guild_ids:
+            state = self.guilds.get(gid)
+            if state is None:
+                continue
+            for item in state.queue:
+                self._finish_item(item, "cleared")
+            state.queue.clear()
+
+            # Los clips enviados al stream que aún no suenan se descartan;
+            # se liberan al resolverse en _wait_clip
+            if state.source is not None:
+                state.source.clear_pending()
+        logger.info("Cola de reproducción limpiada")
@@ -0,0 +1,99 @@
+import json
+import logging
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ChannelRoute:
+    """Pipeline de narración para un canal de texto"""
+    channel_id: int
+    source_language: str = 'en'
+    target_language: str = 'en'
+    voice_name: Optional[str] = None
+    language_code: Optional[str] = None
+    voice_channel_id: Optional[int] = None
+    guild_id: Optional[int] = None
+    low_priority: bool = False  # sin traducción cuando el presupuesto de Google se agota
+    # Fan-out: (guild_id, voice_channel_id) donde se narra el mismo audio; vacío = canal del autor
+    targets: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def needs_translation(self) -> bool:
+        return self.source_language != self.target_language
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ChannelRoute':
+        """Crear una ruta desde un diccionario (JSON o base de datos)"""
+        known = {f.name for f in fields(cls)}
+        values = {key: value for key, value in data.items() if key in known and value is not None}
+        for key in ('channel_id', 'voice_channel_id', 'guild_id'):
+            if key in values:
+                values[key] = int(values[key])
+        if 'targets' in values:
+            targets = values['targets']
+            if isinstance(targets, str):
+                targets = json.loads(targets)
+            values['targets'] = tuple(
+                (int(target['guild_id']), int(target['voice_channel_id'])) if isinstance(target, dict)
+                else (int(target[0]), int(target[1]))
+                for target in targets
+            )
+        return cls(**values)
+
+class ChannelRouter:
+    """Tabla de ruteo canal de texto -> pipeline, con búsqueda O(1) por ID"""
+
+    def __init__(self, routes: Iterable[ChannelRoute] = ()):
+        self._routes: Dict[int, ChannelRoute] = {route.channel_id: route for route in routes}
+
+    def get(self, channel_id: int) -> Optional[ChannelRoute]:
+        return self._routes.get(channel_id)
+
+    def routes(self) -> List[ChannelRoute]:
+        return list(self._routes.values())
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    @classmethod
+    def load(cls, config, db=None) -> 'ChannelRouter':
+        """Cargar rutas desde la configuración y la base de datos.
+
+        Orden de prioridad (las últimas sobrescriben a las primeras):
+        ENGLISH_CHANNEL_ID/SPANISH_CHANNEL_ID, CHANNEL_ROUTES_FILE y la
+        tabla ``channel_routes``.
+        """
+        routes: Dict[int, ChannelRoute] = {}
+
+        # Canales heredados de la configuración original
+        if config.ENGLISH_CHANNEL_ID:
+            route = ChannelRoute(int(config.ENGLISH_CHANNEL_ID), 'en', 'en')
+            routes[route.channel_id] = route
+        if config.SPANISH_CHANNEL_ID:
+            route = ChannelRoute(int(config.SPANISH_CHANNEL_ID), 'es', 'en')
+            routes[route.channel_id] = route
+
+        # Archivo JSON con una lista de rutas
+        if config.CHANNEL_ROUTES_FILE:
+            try:
+                with open(config.CHANNEL_ROUTES_FILE, encoding='utf-8') as f:
+                    for data in json.load(f):
+                        route = ChannelRoute.from_dict(data)
+                        routes[route.channel_id] = route
+            except Exception as e:
+                logger.error(f"Error cargando rutas desde {config.CHANNEL_ROUTES_FILE}: {str(e)}")
+
+        # Rutas guardadas en la base de datos
+        if db is not None:
+            for data in db.get_channel_routes():
+                route = ChannelRoute.from_dict(data)
+                routes[route.channel_id] = route
+
+        if not routes:
+            logger.warning("No hay canales configurados para narración")
+        else:
+            logger.info(f"Tabla de ruteo cargada: {len(routes)} canales")
+
+        return cls(routes.values())
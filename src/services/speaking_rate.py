@@ -0,0 +1,51 @@
+from typing import Dict
+
+class AdaptiveSpeakingRate:
+    """Velocidad de narración por servidor según el audio pendiente en la cola.
+
+    La velocidad sube en línea recta desde ``base_rate`` (con ``low_backlog``
+    segundos pendientes o menos) hasta ``max_rate`` (con ``high_backlog`` o
+    más), redondeada a múltiplos de ``step`` para que la caché de audio siga
+    acertando. Sube en cuanto la cola crece, pero solo baja cuando la cola
+    sigue siendo corta con ``hysteresis`` segundos de margen, así no oscila
+    con cada clip que termina.
+    """
+
+    def __init__(self, base_rate: float, min_rate: float, max_rate: float,
+                 low_backlog: float, high_backlog: float, hysteresis: float = 15.0,
+                 step: float = 0.05, enabled: bool = True):
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.base_rate = self._clamp(base_rate)
+        self.low_backlog = low_backlog
+        self.high_backlog = max(high_backlog, low_backlog + 1.0)
+        self.hysteresis = hysteresis
+        self.step = step
+        self.enabled = enabled
+        self._rates: Dict[int, float] = {}
+
+    def rate_for(self, guild_id: int, backlog_seconds: float) -> float:
+        """Elegir la velocidad para un clip nuevo del servidor"""
+        if not self.enabled:
+            return self.base_rate
+        current = self._rates.get(guild_id, self.base_rate)
+        target = self._target(backlog_seconds)
+        if target < current:
+            # Bajar solo si la cola lo justifica incluso con el margen de histéresis
+            target = min(current, self._target(backlog_seconds + self.hysteresis))
+        self._rates[guild_id] = target
+        return target
+
+    def current(self, guild_id: int) -> float:
+        return self._rates.get(guild_id, self.base_rate)
+
+    def _target(self, backlog_seconds: float) -> float:
+        fraction = (backlog_seconds - self.low_backlog) / (self.high_backlog - self.low_backlog)
+        fraction = min(1.0, max(0.0, fraction))
+        rate = self.base_rate + (self.max_rate - self.base_rate) * fraction
+        if self.step > 0:
+            rate = round(round(rate / self.step) * self.step, 2)
+        return self._clamp(rate)
+
+    def _clamp(self, rate: float) -> float:
+        return min(self.max_rate, max(self.min_rate, rate))
@@ -0,0 +1,136 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Resuelve (tipo, id) -> nombre legible; tipo es 'user', 'role' o 'channel'
+MentionResolver = Callable[[str, int], Optional[str]]
+
+MENTION_PATTERN = re.compile(r'<(@!?|@&|#)(\d+)>')
+CUSTOM_EMOJI_PATTERN = re.compile(r'<a?:\w+:\d+>')
+TIMESTAMP_PATTERN = re.compile(r'<t:\d+(?::\w)?>')
+URL_PATTERN = re.compile(r'https?://(?:www\.)?([^/\s]+)\S*|www\.([^/\s]+)\S*')
+CODE_BLOCK_PATTERN = re.compile(r'```(?:\w+\n)?(.*?)```', re.DOTALL)
+MARKDOWN_PATTERN = re.compile(r'\*\*|__|~~|\|\||`|(?<!\w)[*_](?=\S)|(?<=\S)[*_](?!\w)')
+QUOTE_PATTERN = re.compile(r'^\s*>+\s?', re.MULTILINE)
+HEADER_PATTERN = re.compile(r'^\s*#{1,3}\s+', re.MULTILINE)
+EMOJI_PATTERN = re.compile(
+    '[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]+'
+)
+REPEATED_PUNCTUATION_PATTERN = re.compile(r'([!?.,\-=~*])\1+')
+REPEATED_LETTER_PATTERN = re.compile(r'([^\W\d_])\1{2,}')
+REPEATED_WORD_PATTERN = re.compile(r'\b(\w+)(?:\s+\1\b)+', re.IGNORECASE)
+TICKER_PATTERN = re.compile(r'\$([A-Z]{1,6})\b')
+PERCENT_PATTERN = re.compile(r'([+-])?(\d+(?:[.,]\d+)?)\s?%')
+MAGNITUDE_PATTERN = re.compile(r'(?<![\w.])(\d+(?:[.,]\d+)?)([kKmMbB])\b')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Vocabulario para expandir abreviaturas financieras según el idioma de la voz
+FINANCIAL_WORDS = {
+    'en': {'k': 'thousand', 'm': 'million', 'b': 'billion',
+           '+': 'plus', '-': 'minus', '%': 'percent'},
+    'es': {'k': 'mil', 'm': 'millones', 'b': 'mil millones',
+           '+': 'más', '-': 'menos', '%': 'por ciento'}
+}
+
+@dataclass
+class NormalizationResult:
+    text: str
+    original_chars: int
+    chars_saved: int  # caracteres facturables ahorrados (nunca negativo)
+    seconds_saved: float
+
+class TTSNormalizer:
+    """Compactar el texto de Discord antes de enviarlo a TTS.
+
+    Resuelve menciones a nombres, elimina markup de emojis y markdown, acorta
+    URLs a su dominio y colapsa repeticiones. Las abreviaturas financieras
+    (5k, -3.2%) se expanden a una forma que se narra bien solo mientras el
+    texto resultante no sea más largo que el original.
+    """
+
+    def __init__(self, chars_per_second: float = 14.0):
+        self.chars_per_second = chars_per_second
+        self.messages = 0
+        self.chars_in = 0
+        self.chars_saved = 0
+        self.seconds_saved = 0.0
+
+    def normalize(self, text: str, language_code: str = 'en-US',
+                  resolver: Optional[MentionResolver] = None,
+                  speaking_rate: float = 1.0) -> NormalizationResult:
+        """Normalizar un mensaje y registrar el ahorro"""
+        words = FINANCIAL_WORDS.get(language_code.split('-')[0].lower(), FINANCIAL_WORDS['en'])
+        result = text
+
+        # Markup de Discord
+        result = MENTION_PATTERN.sub(lambda m: self._resolve_mention(m, resolver), result)
+        result = CUSTOM_EMOJI_PATTERN.sub(' ', result)
+        result = TIMESTAMP_PATTERN.sub(' ', result)
+        result = URL_PATTERN.sub(lambda m: f' {m.group(1) or m.group(2)} ', result)
+
+        # Markdown
+        result = CODE_BLOCK_PATTERN.sub(r'\1', result)
+        result = QUOTE_PATTERN.sub('', result)
+        result = HEADER_PATTERN.sub('', result)
+        result = MARKDOWN_PATTERN.sub('', result)
+
+        # Repeticiones y emojis unicode
+        result = EMOJI_PATTERN.sub(' ', result)
+        result = REPEATED_PUNCTUATION_PATTERN.sub(r'\1', result)
+        result = REPEATED_LETTER_PATTERN.sub(r'\1\1', result)
+        result = REPEATED_WORD_PATTERN.sub(r'\1', result)
+
+        # Lo eliminado hasta aquí es audio que ya no se narra; la expansión
+        # financiera no cambia la duración, solo cómo se pronuncia
+        removed_chars = max(0, len(text) - len(WHITESPACE_PATTERN.sub(' ', result).strip()))
+
+        # Abreviaturas financieras; cada expansión gasta parte de lo ya
+        # eliminado y se omite si el texto acabaría más largo que el original
+        result = TICKER_PATTERN.sub(r'\1', result)
+        result = WHITESPACE_PATTERN.sub(' ', result).strip()
+        budget = [len(text) - len(result)]
+        result = PERCENT_PATTERN.sub(
+            lambda m: self._within_budget(m, self._expand_percent(m, words), budget), result
+        )
+        result = MAGNITUDE_PATTERN.sub(
+            lambda m: self._within_budget(m, f"{m.group(1)} {words[m.group(2).lower()]}", budget), result
+        )
+
+        chars_saved = len(text) - len(result)
+        seconds_saved = removed_chars / (self.chars_per_second * max(speaking_rate, 0.25))
+
+        self.messages += 1
+        self.chars_in += len(text)
+        self.chars_saved += chars_saved
+        self.seconds_saved += seconds_saved
+
+        return NormalizationResult(result, len(text), chars_saved, seconds_saved)
+
+    @staticmethod
+    def _resolve_mention(match: re.Match, resolver: Optional[MentionResolver]) -> str:
+        if resolver is None:
+            return ' '
+        kind = {'@': 'user', '@!': 'user', '@&': 'role', '#': 'channel'}[match.group(1)]
+        name = resolver(kind, int(match.group(2)))
+        return f' {name} ' if name else ' '
+
+    @staticmethod
+    def _within_budget(match: re.Match, expansion: str, budget: list) -> str:
+        growth = len(expansion) - len(match.group(0))
+        if growth > budget[0]:
+            return match.group(0)
+        budget[0] -= growth
+        return expansion
+
+    @staticmethod
+    def _expand_percent(match: re.Match, words: dict) -> str:
+        sign = f"{words[match.group(1)]} " if match.group(1) else ''
+        return f"{sign}{match.group(2)} {words['%']}"
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "chars_in": self.chars_in,
+            "chars_saved": self.chars_saved,
+            "seconds_saved": self.seconds_saved
+        }
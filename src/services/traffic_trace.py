@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TrafficEvent:
+    """Llegada de un mensaje, sin contenido ni ids reales"""
+    timestamp: float  # segundos Unix
+    guild: str
+    channel: str
+    length: int
+    template: str  # hash de la plantilla del texto (mismo valor = mismo texto salvo cifras)
+    translate: bool = False
+
+def salt_key(salt: Optional[str]) -> bytes:
+    """Clave de anonimización derivada de la sal (aleatoria si no hay sal)"""
+    if not salt:
+        return os.urandom(16)
+    return hashlib.blake2b(salt.encode('utf-8'), digest_size=32).digest()
+
+def anonymize(value, salt: bytes) -> str:
+    """Identificador opaco y estable (para una misma sal) de un id o texto"""
+    return hashlib.blake2b(str(value).encode('utf-8'), digest_size=8, key=salt).hexdigest()
+
+class TrafficCapture:
+    """Captura de las llegadas de mensajes a un archivo JSONL.
+
+    Solo se guardan el instante, el servidor y el canal anonimizados, la
+    longitud del texto y el hash de su plantilla (el texto con tickers y
+    cifras sustituidos), suficiente para reproducir las ráfagas sin guardar
+    contenido. Sin ``salt`` se usa una sal aleatoria y los ids no coinciden
+    entre reinicios.
+    """
+
+    def __init__(self, path: str, salt: Optional[str] = None, translator=None,
+                 flush_every: int = 100):
+        self.path = path
+        self.salt = salt_key(salt)
+        self.translator = translator
+        self.flush_every = flush_every
+        self.events = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, message, route):
+        """Registrar la llegada de un mensaje a un canal con ruta"""
+        if self._file is None:
+            return
+        try:
+            text = message.content or ''
+            template = self.translator.template(text) if self.translator is not None else text
+            event = TrafficEvent(
+                timestamp=round(time.time(), 3),
+                guild=anonymize(message.guild.id if message.guild else 0, self.salt),
+                channel=anonymize(message.channel.id, self.salt),
+                length=len(text),
+                template=anonymize(template, self.salt),
+                translate=route.needs_translation
+            )
+            self._file.write(json.dumps(asdict(event)) + '\n')
+            self.events += 1
+            if self.events % self.flush_every == 0:
+                self._file.flush()
+        except Exception as e:
+            logger.warning(f"Error capturando tráfico: {str(e)}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def save_trace(events: Iterable[TrafficEvent], path: str) -> int:
+    """Guardar una traza de tráfico como JSONL"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(asdict(event)) + '\n')
+            count += 1
+    return count
+
+def load_trace(path: str) -> List[TrafficEvent]:
+    """Leer una traza JSONL ordenada por instante de llegada"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                events.append(TrafficEvent(**json.loads(line)))
+    events.sort(key=lambda event: event.timestamp)
+    return events
+
+def trace_from_stats(db, since: datetime, until: Optional[datetime] = None,
+                     guild_of: Optional[Dict[int, int]] = None,
+                     salt: Optional[str] = None) -> List[TrafficEvent]:
+    """Reconstruir una traza a partir de ``translation_stats`` y ``tts_stats``.
+
+    Un mensaje traducido deja una fila en cada tabla, así que en los canales
+    con traducciones solo se usan éstas. Los instantes son los de fin de
+    procesamiento, no de llegada, y el hash de plantilla es el del texto
+    completo. Los canales sin servidor conocido en ``guild_of`` comparten
+    uno solo (el peor caso para la cola).
+    """
+    key = salt_key(salt)
+    guild_of = guild_of or {}
+    rows = db.get_message_events(since, until)
+    translated_channels = {channel_id for kind, _, channel_id, _, _ in rows if kind == 'translation'}
+
+    events = []
+    for kind, timestamp, channel_id, text_id, length in rows:
+        if kind == 'tts' and channel_id in translated_channels:
+            continue
+        events.append(TrafficEvent(
+            timestamp=timestamp.replace(tzinfo=timezone.utc).timestamp(),
+            guild=anonymize(guild_of.get(channel_id, 0), key),
+            channel=anonymize(channel_id, key),
+            length=length or 0,
+            template=anonymize(f"text:{text_id}", key),
+            translate=kind == 'translation'
+        ))
+    events.sort(key=lambda event: event.timestamp)
+    return events
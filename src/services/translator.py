@@ -1,50 +1,117 @@
 from google.cloud import translate_v2 as translate
+import asyncio
 import re
 import logging
+import threading
 import time
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from models.stats import Database
+from services.language_filter import TranslationPreFilter
+from services.usage_ledger import TIER_SKIP_TRANSLATION, UsageLedger
+from services.worker_pool import SynthesisWorkerPool
+from utils.config import get_config
+from utils.tracing import Trace, traced
 
 logger = logging.getLogger(__name__)
 
 class TranslationService:
-    def __init__(self):
-        self.client = translate.Client()
+    def __init__(self, db: Optional[Database] = None,
+                 worker_pool: Optional[SynthesisWorkerPool] = None,
+                 usage_ledger: Optional[UsageLedger] = None):
+        self.worker_pool = worker_pool
+        self.usage_ledger = usage_ledger
+        self._client = None
+        self._client_lock = threading.Lock()
         self.financial_terms_cache = {}
-        self.db = Database()
+        self.prefilter = TranslationPreFilter()
+        self.db = db or Database()
         
-    async def translate(self, text: str, channel_id: str, user_id: str) -> str:
-        """Traducir texto de español a inglés preservando términos financieros"""
+        # Caché LRU de plantillas: texto con placeholders -> traducción con placeholders.
+        # Mensajes que solo difieren en tickers o cifras comparten la misma entrada
+        self.cache_size = get_config().TRANSLATION_CACHE_SIZE
+        self._cache: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+    @property
+    def client(self) -> translate.Client:
+        """Cliente de Google Translate, creado en el primer uso"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = translate.Client()
+        return self._client
+        
+    async def translate(self, text: str, channel_id: str, user_id: str,
+                        trace: Optional[Trace] = None, source_language: str = 'es',
+                        target_language: str = 'en', guild_id: Optional[int] = None,
+                        low_priority: bool = False) -> Optional[str]:
+        """Traducir texto (por defecto de español a inglés) preservando términos financieros.
+
+        Devuelve None si el canal es de baja prioridad, la traducción no está
+        en caché y el presupuesto de Google está en el nivel skip_translation.
+        """
         start_time = time.time()
         try:
             # Extraer y preservar elementos especiales
             preserved_items = self._extract_preservables(text)
             
+            # Evitar la llamada a la API si no hay contenido que traducir
+            decision = self.prefilter.classify(text, preserved_items, source_language, target_language)
+            if not decision.translate:
+                if trace:
+                    trace.add_span("translate_skipped", time.perf_counter(), time.perf_counter(),
+                                   reason=decision.reason, chars=len(text))
+                logger.debug(f"Traducción omitida ({decision.reason}): {len(text)} caracteres")
+                return text
+            
             # Reemplazar elementos preservados con placeholders
             text_with_placeholders = self._replace_with_placeholders(text, preserved_items)
             
-            # Traducir el texto
-            translation = self.client.translate(
-                text_with_placeholders,
-                target_language='en',
-                source_language='es'
-            )
+            # Traducir la plantilla, o reutilizarla si ya se tradujo
+            cache_key = (source_language, target_language, text_with_placeholders)
+            translated_text = self._cache_get(cache_key)
+            if translated_text is not None:
+                if trace:
+                    trace.add_span("translate_cache_hit", time.perf_counter(), time.perf_counter(),
+                                   chars=len(text_with_placeholders))
+            else:
+                if (low_priority and self.usage_ledger is not None
+                        and self.usage_ledger.tier() >= TIER_SKIP_TRANSLATION):
+                    if trace:
+                        trace.add_span("translate_budget_skip", time.perf_counter(), time.perf_counter(),
+                                       chars=len(text_with_placeholders))
+                    logger.debug(f"Traducción omitida por presupuesto: {len(text)} caracteres")
+                    return None
+                with traced(trace, "translate", chars=len(text_with_placeholders),
+                            worker=self.worker_pool is not None):
+                    translated_text = await self._translate_remote(
+                        text_with_placeholders,
+                        source_language,
+                        target_language
+                    )
+                if self.usage_ledger is not None:
+                    self.usage_ledger.record('translate', len(text_with_placeholders), guild_id,
+                                             channel_id, user_id)
+                self._cache_put(cache_key, translated_text)
             
             # Restaurar elementos preservados
             final_text = self._restore_preserved_items(
-                translation['translatedText'],
+                translated_text,
                 preserved_items
             )
             
             # Registrar estadísticas
             processing_time = time.time() - start_time
-            self.db.add_translation(
-                channel_id=channel_id,
-                user_id=user_id,
-                original_text=text,
-                translated_text=final_text,
-                processing_time=processing_time
-            )
+            with traced(trace, "translate_stats"):
+                self.db.add_translation(
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    original_text=text,
+                    translated_text=final_text,
+                    processing_time=processing_time
+                )
             
             return final_text
             
@@ -52,6 +119,63 @@ class TranslationService:
             logger.error(f"Error en traducción: {str(e)}")
             raise
             
+    def template(self, text: str) -> str:
+        """Plantilla de un texto: los elementos preservados sustituidos por placeholders"""
+        return self._replace_with_placeholders(text, self._extract_preservables(text))
+        
+    async def warm(self, template: str, source_language: str, target_language: str) -> bool:
+        """Traducir una plantilla directamente a la caché.
+
+        Devuelve False si ya estaba en caché (no se llama a la API).
+        """
+        cache_key = (source_language, target_language, template)
+        if self.cache_size <= 0 or cache_key in self._cache:
+            return False
+        translated_text = await self._translate_remote(template, source_language, target_language)
+        if self.usage_ledger is not None:
+            self.usage_ledger.record('translate', len(template))
+        self._cache_put(cache_key, translated_text)
+        return True
+        
+    def _cache_get(self, cache_key: Tuple[str, str, str]) -> Optional[str]:
+        translated_text = self._cache.get(cache_key)
+        if translated_text is None:
+            self.cache_misses += 1
+            return None
+        self._cache.move_to_end(cache_key)
+        self.cache_hits += 1
+        return translated_text
+        
+    def _cache_put(self, cache_key: Tuple[str, str, str], translated_text: str):
+        if self.cache_size <= 0:
+            return
+        self._cache[cache_key] = translated_text
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            
+    def cache_stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses
+        }
+        
+    async def _translate_remote(self, text: str, source_language: str, target_language: str) -> str:
+        """Llamar a Google Translate en el pool de procesos o, sin pool, con el cliente local en un hilo"""
+        if self.worker_pool is not None:
+            return await self.worker_pool.translate(text, source_language, target_language)
+        # La llamada HTTP es bloqueante: nunca en el hilo del event loop
+        return await asyncio.to_thread(self._translate_local, text, source_language, target_language)
+        
+    def _translate_local(self, text: str, source_language: str, target_language: str) -> str:
+        translation = self.client.translate(
+            text,
+            target_language=target_language,
+            source_language=source_language
+        )
+        return translation['translatedText']
+        
     def _extract_preservables(self, text: str) -> List[Tuple[str, str, int]]:
         """Extraer elementos que deben preservarse durante la traducción"""
         preserved_items = []
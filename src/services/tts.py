@@ -1,66 +1,143 @@
 from google.cloud import texttospeech
+import asyncio
+import hashlib
 import os
 import logging
+import threading
 import uuid
 import time
-from utils.config import Config
+from typing import Optional, Tuple
+from utils.config import get_config
+from utils.tracing import Trace, traced
 from models.stats import Database
+from services.audio_duration import audio_duration
+from services.audio_store import AudioArtifactStore
+from services.speaking_rate import AdaptiveSpeakingRate
+from services.text_normalizer import MentionResolver, TTSNormalizer
+from services.usage_ledger import TIER_NAMES, TIER_NORMAL, TIER_STANDARD_VOICE, TIER_TRUNCATE, UsageLedger, standard_voice
+from services.worker_pool import SynthesisWorkerPool
 
 logger = logging.getLogger(__name__)
 
+# AUDIO_FORMAT -> (codificación de Google TTS, frecuencia de muestreo)
+# wav se pide a 48 kHz para que el stream de voz lo lea sin ffmpeg
+AUDIO_ENCODINGS = {
+    'wav': ('LINEAR16', 48000),
+    'mp3': ('MP3', None),
+    'ogg': ('OGG_OPUS', None)
+}
+
 class TTSService:
-    def __init__(self):
-        self.client = texttospeech.TextToSpeechClient()
-        self.config = Config()
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None,
+                 worker_pool: Optional[SynthesisWorkerPool] = None,
+                 audio_store: Optional[AudioArtifactStore] = None,
+                 usage_ledger: Optional[UsageLedger] = None):
+        self.worker_pool = worker_pool
+        self.audio_store = audio_store
+        self.usage_ledger = usage_ledger
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.config = get_config()
+        self.db = db or Database()
+        self.normalizer = TTSNormalizer(self.config.TTS_CHARS_PER_SECOND)
+        self.rate_controller = AdaptiveSpeakingRate(
+            base_rate=self.config.TTS_SPEAKING_RATE,
+            min_rate=self.config.TTS_RATE_MIN,
+            max_rate=self.config.TTS_RATE_MAX,
+            low_backlog=self.config.TTS_RATE_BACKLOG_LOW,
+            high_backlog=self.config.TTS_RATE_BACKLOG_HIGH,
+            hysteresis=self.config.TTS_RATE_HYSTERESIS,
+            step=self.config.TTS_RATE_STEP,
+            enabled=self.config.TTS_ADAPTIVE_RATE
+        )
+        self.audio_encoding, self.sample_rate_hertz = AUDIO_ENCODINGS.get(
+            self.config.AUDIO_FORMAT, AUDIO_ENCODINGS['mp3']
+        )
+        if self.audio_encoding != 'LINEAR16':
+            logger.warning(f"AUDIO_FORMAT={self.config.AUDIO_FORMAT}: cada clip se decodifica con "
+                           "un proceso ffmpeg propio; usa wav para reproducción continua sin ffmpeg")
         
         # Crear directorio temporal si no existe
         os.makedirs(self.config.AUDIO_TEMP_DIR, exist_ok=True)
         
-    async def generate_audio(self, text: str, channel_id: str, user_id: str) -> str:
-        """Generar archivo de audio a partir de texto"""
+    @property
+    def client(self) -> texttospeech.TextToSpeechClient:
+        """Cliente de Google TTS, creado en el primer uso"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = texttospeech.TextToSpeechClient()
+        return self._client
+        
+    async def generate_audio(self, text: str, channel_id: str, user_id: str,
+                             trace: Optional[Trace] = None, voice_name: Optional[str] = None,
+                             language_code: Optional[str] = None,
+                             resolver: Optional[MentionResolver] = None,
+                             speaking_rate: Optional[float] = None,
+                             guild_id: Optional[int] = None) -> Optional[str]:
+        """Generar archivo de audio a partir de texto.
+
+        ``speaking_rate`` es la velocidad elegida con choose_speaking_rate; por
+        defecto, la base. Con el presupuesto de Google casi agotado se usa la
+        voz Standard y, después, se recorta el texto. Devuelve None si tras
+        normalizar el texto no queda nada que narrar.
+        """
+        voice_name, language_code = self.resolve_voice(voice_name, language_code)
+        speaking_rate = speaking_rate or self.rate_controller.base_rate
+        tier = self.usage_ledger.tier() if self.usage_ledger is not None else TIER_NORMAL
+        if tier >= TIER_STANDARD_VOICE:
+            voice_name = standard_voice(voice_name)
         start_time = time.time()
         try:
-            # Configurar la entrada de texto
-            synthesis_input = texttospeech.SynthesisInput(text=text)
-            
-            # Configurar la voz
-            voice = texttospeech.VoiceSelectionParams(
-                language_code=self.config.TTS_LANGUAGE_CODE,
-                name=self.config.TTS_VOICE_NAME
-            )
-            
-            # Configurar el audio
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=self.config.TTS_SPEAKING_RATE,
-                pitch=self.config.TTS_PITCH
-            )
-            
-            # Realizar la síntesis
-            response = self.client.synthesize_speech(
-                input=synthesis_input,
-                voice=voice,
-                audio_config=audio_config
-            )
-            
-            # Generar nombre único para el archivo
-            filename = f"{uuid.uuid4()}.{self.config.AUDIO_FORMAT}"
-            filepath = os.path.join(self.config.AUDIO_TEMP_DIR, filename)
-            
-            # Guardar el audio
-            with open(filepath, "wb") as out:
-                out.write(response.audio_content)
+            # Compactar el texto antes de la síntesis
+            with traced(trace, "tts_normalize") as span:
+                normalized = self.normalizer.normalize(
+                    text,
+                    language_code,
+                    resolver,
+                    speaking_rate
+                )
+                if span:
+                    span.attributes.update(
+                        chars_saved=normalized.chars_saved,
+                        seconds_saved=round(normalized.seconds_saved, 2)
+                    )
+            text = normalized.text
+            if not text:
+                logger.debug("Texto vacío tras normalizar, no se genera audio")
+                return None
+            if tier >= TIER_TRUNCATE and len(text) > self.config.USAGE_TRUNCATE_CHARS:
+                text = text[:self.config.USAGE_TRUNCATE_CHARS].rsplit(' ', 1)[0]
+            if tier > TIER_NORMAL and trace:
+                trace.add_span("usage_degraded", time.perf_counter(), time.perf_counter(),
+                               tier=TIER_NAMES[tier], voice=voice_name, chars=len(text))
+                
+            # Reutilizar el audio si el mismo texto ya se sintetizó con la misma voz
+            cache_key = self.cache_key(text, voice_name, language_code, speaking_rate)
+            filepath = self.audio_store.lookup(cache_key) if self._cache_enabled else None
+            if filepath is not None:
+                if trace:
+                    trace.add_span("tts_cache_hit", time.perf_counter(), time.perf_counter(),
+                                   chars=len(text), rate=speaking_rate)
+            else:
+                # La referencia inicial pertenece a quien encola el audio
+                filepath = await self._synthesize_to_file(
+                    text, voice_name, language_code, speaking_rate, cache_key, refs=1, trace=trace
+                )
+                if self.usage_ledger is not None:
+                    self.usage_ledger.record('tts', len(text), guild_id, channel_id, user_id,
+                                             voice_name=voice_name)
                 
-            # Registrar estadísticas
+            # Registrar estadísticas (también los aciertos de caché, que alimentan el precalentamiento)
             processing_time = time.time() - start_time
-            self.db.add_tts(
-                channel_id=channel_id,
-                user_id=user_id,
-                text=text,
-                audio_file=filepath,
-                processing_time=processing_time
-            )
+            with traced(trace, "tts_stats"):
+                self.db.add_tts(
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    text=text,
+                    speaking_rate=speaking_rate,
+                    processing_time=processing_time
+                )
                 
             logger.debug(f"Audio generado: {filepath}")
             return filepath
@@ -69,31 +146,130 @@ class TTSService:
             logger.error(f"Error en generación de audio: {str(e)}")
             raise
             
-    def cleanup_old_files(self, max_age_hours: int = 1):
-        """Limpiar archivos de audio antiguos"""
-        try:
-            current_time = time.time()
+    def resolve_voice(self, voice_name: Optional[str] = None,
+                      language_code: Optional[str] = None) -> Tuple[str, str]:
+        """Completar voz e idioma con los valores por defecto"""
+        voice_name = voice_name or self.config.TTS_VOICE_NAME
+        if not language_code:
+            # Los nombres de voz de Google empiezan por el código de idioma (en-US-Neural2-D)
+            language_code = (
+                '-'.join(voice_name.split('-')[:2]) if voice_name != self.config.TTS_VOICE_NAME
+                else self.config.TTS_LANGUAGE_CODE
+            )
+        return voice_name, language_code
+        
+    def choose_speaking_rate(self, guild_id: Optional[int], backlog_seconds: float) -> float:
+        """Velocidad de narración para un clip nuevo según el audio pendiente del servidor"""
+        if guild_id is None:
+            return self.rate_controller.base_rate
+        return self.rate_controller.rate_for(guild_id, backlog_seconds)
+        
+    def cache_key(self, text: str, voice_name: str, language_code: str, speaking_rate: float) -> str:
+        """Clave de la caché de audio: texto normalizado y parámetros de síntesis"""
+        raw = '|'.join((
+            voice_name,
+            language_code,
+            f"{speaking_rate:g}",
+            f"{self.config.TTS_PITCH:g}",
+            self.audio_encoding,
+            text
+        ))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        
+    @property
+    def _cache_enabled(self) -> bool:
+        return self.audio_store is not None and self.config.AUDIO_CACHE_ENABLED
+        
+    async def warm(self, text: str, voice_name: Optional[str] = None,
+                   language_code: Optional[str] = None) -> bool:
+        """Sintetizar texto ya normalizado directamente a la caché de audio.
+
+        Devuelve False si ya estaba en caché (no se llama a la API).
+        """
+        if not self._cache_enabled:
+            return False
+        voice_name, language_code = self.resolve_voice(voice_name, language_code)
+        # Se precalienta a la velocidad base, la que se usa con la cola corta
+        speaking_rate = self.rate_controller.base_rate
+        cache_key = self.cache_key(text, voice_name, language_code, speaking_rate)
+        if self.audio_store.contains(cache_key):
+            return False
+        await self._synthesize_to_file(text, voice_name, language_code, speaking_rate, cache_key,
+                                       refs=0)
+        if self.usage_ledger is not None:
+            self.usage_ledger.record('tts', len(text), voice_name=voice_name)
+        return True
+        
+    async def _synthesize_to_file(self, text: str, voice_name: str, language_code: str,
+                                  speaking_rate: float, cache_key: str, refs: int,
+                                  trace: Optional[Trace] = None) -> str:
+        """Sintetizar, guardar el audio y registrarlo en el índice de artefactos"""
+        with traced(trace, "tts", chars=len(text), rate=speaking_rate, worker=self.worker_pool is not None):
+            audio_content = await self._synthesize(text, voice_name, language_code, speaking_rate)
             
-            for filename in os.listdir(self.config.AUDIO_TEMP_DIR):
-                filepath = os.path.join(self.config.AUDIO_TEMP_DIR, filename)
+        # Generar nombre único para el archivo
+        filename = f"{uuid.uuid4()}.{self.config.AUDIO_FORMAT}"
+        filepath = os.path.join(self.config.AUDIO_TEMP_DIR, filename)
+        
+        # Guardar el audio
+        with traced(trace, "tts_write", bytes=len(audio_content)):
+            with open(filepath, "wb") as out:
+                out.write(audio_content)
                 
-                # Verificar edad del archivo
-                file_age = current_time - os.path.getctime(filepath)
-                if file_age > (max_age_hours * 3600):
-                    try:
-                        os.remove(filepath)
-                        logger.debug(f"Archivo eliminado: {filepath}")
-                    except Exception as e:
-                        logger.warning(f"Error al eliminar archivo {filepath}: {str(e)}")
-                        
-        except Exception as e:
-            logger.error(f"Error en limpieza de archivos: {str(e)}")
+        # Duración exacta desde las cabeceras; si no se puede leer, estimada por caracteres
+        duration = audio_duration(audio_content, self.audio_encoding)
+        if duration is None:
+            duration = len(text) / (self.config.TTS_CHARS_PER_SECOND * speaking_rate)
             
-    def cleanup_file(self, filepath: str):
-        """Limpiar un archivo específico"""
-        try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                logger.debug(f"Archivo eliminado: {filepath}")
-        except Exception as e:
-            logger.warning(f"Error al eliminar archivo {filepath}: {str(e)}") 
\ No newline at end of file
+        if self.audio_store is not None:
+            self.audio_store.register(
+                filepath,
+                len(audio_content),
+                refs=refs,
+                cache_key=cache_key if self._cache_enabled else None,
+                duration=duration
+            )
+        return filepath
+        
+    async def _synthesize(self, text: str, voice_name: str, language_code: str,
+                          speaking_rate: float) -> bytes:
+        """Sintetizar texto en el pool de procesos o, sin pool, con el cliente local en un hilo"""
+        if self.worker_pool is not None:
+            return await self.worker_pool.synthesize(
+                text,
+                voice_name,
+                language_code,
+                speaking_rate,
+                self.config.TTS_PITCH,
+                self.audio_encoding,
+                self.sample_rate_hertz
+            )
+        # La llamada gRPC es bloqueante: nunca en el hilo del event loop
+        return await asyncio.to_thread(self._synthesize_local, text, voice_name, language_code,
+                                       speaking_rate)
+        
+    def _synthesize_local(self, text: str, voice_name: str, language_code: str,
+                          speaking_rate: float) -> bytes:
+        # Configurar la entrada de texto
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+        
+        # Configurar la voz
+        voice = texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            name=voice_name
+        )
+        
+        # Configurar el audio
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding[self.audio_encoding],
+            speaking_rate=speaking_rate,
+            pitch=self.config.TTS_PITCH,
+            sample_rate_hertz=self.sample_rate_hertz or 0
+        )
+        
+        response = self.client.synthesize_speech(
+            input=synthesis_input,
+            voice=voice,
+            audio_config=audio_config
+        )
+        return response.audio_content
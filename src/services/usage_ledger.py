@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Niveles de degradación; cada uno incluye los anteriores
+TIER_NORMAL = 0
+TIER_STANDARD_VOICE = 1
+TIER_TRUNCATE = 2
+TIER_SKIP_TRANSLATION = 3
+TIER_NAMES = ('normal', 'standard_voice', 'truncate', 'skip_translation')
+
+# Tipos de voz de Google con precio premium; el resto se factura como Standard
+PREMIUM_VOICE_TYPES = ('Neural2', 'Wavenet', 'Studio', 'Journey', 'Polyglot', 'News')
+
+UsageKey = Tuple[str, str, int]  # (api, ámbito, id)
+
+def is_premium_voice(voice_name: str) -> bool:
+    return any(f"-{voice_type}-" in voice_name for voice_type in PREMIUM_VOICE_TYPES)
+
+def standard_voice(voice_name: str) -> str:
+    """Voz Standard equivalente (mismo idioma y variante): en-US-Neural2-D -> en-US-Standard-D"""
+    for voice_type in PREMIUM_VOICE_TYPES:
+        if f"-{voice_type}-" in voice_name:
+            return voice_name.replace(f"-{voice_type}-", "-Standard-", 1)
+    return voice_name
+
+class UsageLedger:
+    """Registro rotativo del consumo de Google TTS y Translate.
+
+    Cada llamada a la API suma caracteres, peticiones y coste estimado por
+    servidor, canal y usuario en cubos de una hora (se conservan 24). El
+    coste total se acumula además por minuto para medir la última hora y el
+    último día contra ``hourly_budget`` y ``daily_budget`` (0 = sin límite).
+    Con la fracción consumida del presupuesto más ajustado se elige el nivel
+    de degradación: ``thresholds`` son las fracciones a partir de las que se
+    activa cada nivel por encima de TIER_NORMAL.
+
+    Con ``store`` (la base de estadísticas) los cubos por hora modificados se
+    guardan con flush() y se recargan al crear el registro, así un reinicio
+    no pone el gasto a cero. El gasto de cada hora recargada cuenta como
+    hecho en su último minuto (estimación conservadora para la última hora).
+    """
+
+    def __init__(self, hourly_budget: float = 0.0, daily_budget: float = 0.0,
+                 thresholds: Tuple[float, ...] = (0.8, 0.9, 0.95),
+                 premium_tts_price: float = 16.0, standard_tts_price: float = 4.0,
+                 translate_price: float = 20.0, store=None,
+                 on_tier_change: Optional[Callable[[int, int], None]] = None):
+        self.hourly_budget = hourly_budget
+        self.daily_budget = daily_budget
+        self.thresholds = tuple(sorted(thresholds))[:len(TIER_NAMES) - 1]
+        self.prices = {'premium': premium_tts_price, 'standard': standard_tts_price,
+                       'translate': translate_price}  # USD por millón de caracteres
+        self.on_tier_change = on_tier_change
+        self.store = store
+        self.tier_changes: Counter = Counter()
+        self._tier = TIER_NORMAL
+        self._lock = threading.Lock()
+        # Las mismas entradas [minuto, coste] en la ventana del día y en la de la hora
+        self._minutes: Deque[List] = deque()
+        self._recent: Deque[List] = deque()
+        self._hours: Deque[Tuple[int, Dict[UsageKey, List[float]]]] = deque()  # (hora, clave -> [chars, peticiones, coste])
+        self._dirty_hours: Set[int] = set()
+        self._hour_cost = 0.0
+        self._day_cost = 0.0
+        if store is not None:
+            self._load()
+            # Sin avisar a on_tier_change: quien lo escucha aún se está creando
+            self._tier = self._tier_for(self.budget_fraction())
+
+    def cost(self, api: str, characters: int, voice_name: Optional[str] = None) -> float:
+        if api == 'tts':
+            price = self.prices['premium' if voice_name and is_premium_voice(voice_name) else 'standard']
+        else:
+            price = self.prices['translate']
+        return characters * price / 1_000_000
+
+    def record(self, api: str, characters: int, guild_id: Optional[int] = None,
+               channel_id=None, user_id=None, voice_name: Optional[str] = None):
+        """Registrar una llamada a la API ('tts' o 'translate')"""
+        cost = self.cost(api, characters, voice_name)
+        now = time.time()
+        minute = int(now // 60)
+        hour = minute // 60
+        with self._lock:
+            self._expire(minute)
+            self._add_minute_cost(minute, cost)
+
+            if not self._hours or self._hours[-1][0] != hour:
+                self._hours.append((hour, {}))
+            self._dirty_hours.add(hour)
+            bucket = self._hours[-1][1]
+            for scope, value in (('guild', guild_id), ('channel', channel_id), ('user', user_id)):
+                entry = bucket.setdefault((api, scope, int(value) if value else 0), [0, 0, 0.0])
+                entry[0] += characters
+                entry[1] += 1
+                entry[2] += cost
+        self.tier()
+
+    def _add_minute_cost(self, minute: int, cost: float):
+        if self._minutes and self._minutes[-1][0] == minute:
+            # La entrada es la misma lista en las dos ventanas
+            self._minutes[-1][1] += cost
+        else:
+            entry = [minute, cost]
+            self._minutes.append(entry)
+            self._recent.append(entry)
+        self._hour_cost += cost
+        self._day_cost += cost
+
+    def _expire(self, minute: int):
+        # Totales acumulados: solo se restan las entradas que salen de cada ventana
+        while self._minutes and self._minutes[0][0] <= minute - 1440:
+            self._day_cost -= self._minutes.popleft()[1]
+        while self._recent and self._recent[0][0] <= minute - 60:
+            self._hour_cost -= self._recent.popleft()[1]
+        # Sin entradas el total es exactamente 0 (sin residuos de coma flotante)
+        self._day_cost = max(0.0, self._day_cost) if self._minutes else 0.0
+        self._hour_cost = max(0.0, self._hour_cost) if self._recent else 0.0
+        while self._hours and self._hours[0][0] <= minute // 60 - 24:
+            self._hours.popleft()
+
+    def _load(self):
+        """Recargar de ``store`` los cubos de las últimas 24 horas"""
+        now_minute = int(time.time() // 60)
+        buckets: Dict[int, Dict[UsageKey, List[float]]] = {}
+        for hour, api, scope, object_id, characters, requests, cost in self.store.get_usage_buckets(
+                now_minute // 60 - 23):
+            buckets.setdefault(hour, {})[(api, scope, object_id)] = [characters, requests, cost]
+        with self._lock:
+            for hour in sorted(buckets):
+                bucket = buckets[hour]
+                self._hours.append((hour, bucket))
+                # Cada llamada se registra una vez por ámbito: el coste total es el de 'guild'
+                cost = sum(values[2] for (_, scope, _), values in bucket.items() if scope == 'guild')
+                minute = min(hour * 60 + 59, now_minute)
+                if minute > now_minute - 60:
+                    self._add_minute_cost(minute, cost)
+                else:
+                    self._minutes.append([minute, cost])
+                    self._day_cost += cost
+            self._expire(now_minute)
+        if buckets:
+            hour_cost, day_cost = self._hour_cost, self._day_cost
+            logger.info(f"Consumo de Google recargado: {len(buckets)} horas, "
+                        f"${hour_cost:.2f} en la última hora, ${day_cost:.2f} en el último día")
+
+    def flush(self):
+        """Guardar en ``store`` los cubos por hora modificados desde el último flush"""
+        if self.store is None:
+            return
+        with self._lock:
+            dirty = [
+                (hour, {key: list(values) for key, values in bucket.items()})
+                for hour, bucket in self._hours if hour in self._dirty_hours
+            ]
+            self._dirty_hours.clear()
+        if not dirty:
+            return
+        try:
+            self.store.save_usage_buckets(dirty)
+        except Exception as e:
+            logger.error(f"Error guardando el consumo de Google: {str(e)}")
+            with self._lock:
+                self._dirty_hours.update(hour for hour, _ in dirty)
+
+    def spend(self) -> Tuple[float, float]:
+        """Coste estimado (USD) de la última hora y del último día"""
+        with self._lock:
+            self._expire(int(time.time() // 60))
+            return self._hour_cost, self._day_cost
+
+    def budget_fraction(self) -> float:
+        """Fracción consumida del presupuesto más ajustado (0 sin presupuestos)"""
+        hour_cost, day_cost = self.spend()
+        fractions = [0.0]
+        if self.hourly_budget > 0:
+            fractions.append(hour_cost / self.hourly_budget)
+        if self.daily_budget > 0:
+            fractions.append(day_cost / self.daily_budget)
+        return max(fractions)
+
+    def tier(self) -> int:
+        """Nivel de degradación actual; los cambios se registran con ``on_tier_change``"""
+        fraction = self.budget_fraction()
+        tier = self._tier_for(fraction)
+        if tier != self._tier:
+            previous, self._tier = self._tier, tier
+            self.tier_changes[TIER_NAMES[tier]] += 1
+            log = logger.warning if tier > previous else logger.info
+            log(f"Nivel de consumo de Google: {TIER_NAMES[previous]} -> {TIER_NAMES[tier]} "
+                f"({fraction * 100:.0f}% del presupuesto)")
+            if self.on_tier_change is not None:
+                try:
+                    self.on_tier_change(previous, tier)
+                except Exception as e:
+                    logger.error(f"Error registrando el cambio de nivel de consumo: {str(e)}")
+        return tier
+
+    def _tier_for(self, fraction: float) -> int:
+        return sum(1 for threshold in self.thresholds if fraction >= threshold)
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """Caracteres, peticiones y coste por API en las últimas 24 horas"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for api, values in self._aggregate('guild').items():
+            entry = totals.setdefault(api[0], {'characters': 0, 'requests': 0, 'cost': 0.0})
+            entry['characters'] += values[0]
+            entry['requests'] += values[1]
+            entry['cost'] += values[2]
+        return totals
+
+    def top(self, scope: str, limit: int = 5) -> List[Tuple[int, float, int]]:
+        """Mayores consumidores de un ámbito en 24 horas: (id, coste, caracteres)"""
+        by_id: Dict[int, List[float]] = {}
+        for (api, object_id), values in self._aggregate(scope).items():
+            entry = by_id.setdefault(object_id, [0.0, 0])
+            entry[0] += values[2]
+            entry[1] += values[0]
+        ranked = sorted(by_id.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(object_id, cost, characters) for object_id, (cost, characters) in ranked]
+
+    def _aggregate(self, scope: str) -> Dict[Tuple[str, int], List[float]]:
+        aggregated: Dict[Tuple[str, int], List[float]] = {}
+        with self._lock:
+            self._expire(int(time.time() // 60))
+            for _, bucket in self._hours:
+                for (api, key_scope, object_id), values in bucket.items():
+                    if key_scope != scope:
+                        continue
+                    entry = aggregated.setdefault((api, object_id), [0, 0, 0.0])
+                    for i, value in enumerate(values):
+                        entry[i] += value
+        return aggregated
+
+    def stats(self) -> dict:
+        hour_cost, day_cost = self.spend()
+        return {
+            "tier": TIER_NAMES[self._tier],
+            "hour_cost": hour_cost,
+            "day_cost": day_cost,
+            "budget_fraction": self.budget_fraction(),
+            "tier_changes": sum(self.tier_changes.values())
+        }
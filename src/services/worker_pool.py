@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Clientes de Google propios de cada proceso trabajador
+_translate_client = None
+_tts_client = None
+
+def _init_worker():
+    """Crear los clientes de Google al arrancar cada proceso trabajador"""
+    global _translate_client, _tts_client
+    from google.cloud import texttospeech
+    from google.cloud import translate_v2 as translate
+
+    _translate_client = translate.Client()
+    _tts_client = texttospeech.TextToSpeechClient()
+
+def _translate_in_worker(text: str, source_language: str, target_language: str) -> str:
+    translation = _translate_client.translate(
+        text,
+        target_language=target_language,
+        source_language=source_language
+    )
+    return translation['translatedText']
+
+def _synthesize_in_worker(text: str, voice_name: str, language_code: str, speaking_rate: float,
+                          pitch: float, audio_encoding: str, sample_rate_hertz: Optional[int]) -> bytes:
+    from google.cloud import texttospeech
+
+    response = _tts_client.synthesize_speech(
+        input=texttospeech.SynthesisInput(text=text),
+        voice=texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            name=voice_name
+        ),
+        audio_config=texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding[audio_encoding],
+            speaking_rate=speaking_rate,
+            pitch=pitch,
+            sample_rate_hertz=sample_rate_hertz or 0
+        )
+    )
+    return response.audio_content
+
+class SynthesisWorkerPool:
+    """Pool de procesos para las llamadas a Google Translate y TTS.
+
+    Las peticiones y los resultados (texto o bytes de audio) viajan por las
+    colas IPC de multiprocessing, de modo que el event loop del gateway
+    nunca ejecuta las llamadas bloqueantes ni la serialización gRPC.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        logger.info(f"Pool de síntesis iniciado con {workers} procesos (pid {os.getpid()})")
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            raise RuntimeError("El pool de síntesis está detenido")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def translate(self, text: str, source_language: str, target_language: str) -> str:
+        """Traducir texto en un proceso trabajador"""
+        return await self._submit(_translate_in_worker, text, source_language, target_language)
+
+    async def synthesize(self, text: str, voice_name: str, language_code: str, speaking_rate: float,
+                         pitch: float, audio_encoding: str, sample_rate_hertz: Optional[int] = None) -> bytes:
+        """Sintetizar audio en un proceso trabajador y devolver los bytes"""
+        return await self._submit(
+            _synthesize_in_worker, text, voice_name, language_code,
+            speaking_rate, pitch, audio_encoding, sample_rate_hertz
+        )
+
+    def shutdown(self):
+        """Detener los procesos trabajadores"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Pool de síntesis detenido")
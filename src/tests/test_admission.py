@@ -0,0 +1,132 @@
+"""Control de admisión con ráfagas concurrentes.
+
+Usa los backends locales de tools.replay_traffic en lugar de Google y
+Discord. Ejecutar desde src/:
+    python -m unittest tests.test_admission
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+WORKDIR = tempfile.mkdtemp(prefix='test_admission_')
+MAX_BACKLOG = 60.0
+
+# La configuración se carga una sola vez por proceso: antes de importar el bot
+os.environ.update({
+    'DB_PATH': os.path.join(WORKDIR, 'test.db'),
+    'AUDIO_TEMP_DIR': os.path.join(WORKDIR, 'audio'),
+    'AUDIO_FORMAT': 'wav',
+    'SYNTH_WORKERS': '0',
+    'CACHE_WARMUP_ENABLED': 'false',
+    'STATS_RETENTION_DAYS': '0',
+    'TRAFFIC_CAPTURE_FILE': '',
+    'CHANNEL_ROUTES_FILE': '',
+    'VOICE_CHANNEL_ID': '',
+    'COMMAND_SYNC_STATE_FILE': os.path.join(WORKDIR, 'command_sync.json'),
+    'ADMISSION_MAX_BACKLOG_SECONDS': str(MAX_BACKLOG),
+    'ADMISSION_POLICY': 'summarize',
+    'TTS_ADAPTIVE_RATE': 'false',
+    'LOOP_MONITOR_ENABLED': 'false'
+})
+for name in ('DISCORD_TOKEN', 'GOOGLE_CLOUD_PROJECT', 'GOOGLE_APPLICATION_CREDENTIALS'):
+    os.environ.setdefault(name, 'test')
+
+from bot.discord_bot import NarradorBot
+from services.router import ChannelRoute
+from tools.replay_traffic import (StandInGuild, StandInTextChannel, StandInTranslateClient,
+                                  StandInTTSClient)
+
+# Mensajes de 200 caracteres (unos 14 s de audio cada uno), distintos para no acertar en caché
+BURST_TEXT = ('market update ' * 15)[:200]
+BURST_SIZE = 40
+
+def setUpModule():
+    logging.disable(logging.WARNING)
+
+def tearDownModule():
+    logging.disable(logging.NOTSET)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+class AdmissionBurstTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = NarradorBot()
+        # Latencias reales: toda la ráfaga llega antes de que se encole el primer clip
+        self.bot.translator._client = StandInTranslateClient(latency=0.2, speed=1.0)
+        self.bot.tts._client = StandInTTSClient(latency=0.3, speed=1.0,
+                                                chars_per_second=self.bot.config.TTS_CHARS_PER_SECOND)
+        self.guild = StandInGuild(1, speed=1.0, voice_latency=0.0)
+        self.channel = StandInTextChannel(100, self.guild)
+
+    async def asyncTearDown(self):
+        for state in self.bot.queue_manager.guilds.values():
+            if state.task is not None:
+                state.task.cancel()
+        if self.guild.voice_client is not None:
+            await self.guild.voice_client.disconnect()
+        await self.bot.close()
+
+    def _message(self, index: int):
+        author = SimpleNamespace(
+            id=index + 1, name=f"usuario-{index}", display_name=f"usuario-{index}",
+            guild=self.guild, voice=SimpleNamespace(channel=self.guild.voice_channel)
+        )
+        return SimpleNamespace(content=f"{index:03d} {BURST_TEXT}"[:200], channel=self.channel,
+                               author=author, guild=self.guild)
+
+    async def _burst(self, route: ChannelRoute):
+        queue_manager = self.bot.queue_manager
+        peak = 0.0
+
+        async def sample():
+            nonlocal peak
+            while True:
+                peak = max(peak, queue_manager.backlog_seconds(self.guild.id)
+                           + queue_manager.reserved_seconds(self.guild.id))
+                await asyncio.sleep(0.01)
+
+        sampler = asyncio.create_task(sample())
+        await asyncio.gather(*(
+            self.bot.process_channel_message(self._message(index), route)
+            for index in range(BURST_SIZE)
+        ))
+        sampler.cancel()
+        return peak
+
+    async def test_burst_respects_backlog_limit(self):
+        route = ChannelRoute(self.channel.id, guild_id=self.guild.id)
+        peak = await self._burst(route)
+
+        stats = self.bot.admission.stats()
+        accepted = stats['accepted'] + stats['summarized']
+        self.assertGreater(stats['rejected'], 0)
+        self.assertLess(accepted, BURST_SIZE)
+        # La duración real puede diferir algo de la estimada (normalización, cabeceras WAV)
+        self.assertLessEqual(peak, MAX_BACKLOG * 1.1)
+        self.assertLessEqual(self.bot.queue_manager.backlog_seconds(self.guild.id), MAX_BACKLOG * 1.1)
+        self.assertAlmostEqual(self.bot.queue_manager.reserved_seconds(self.guild.id), 0.0)
+
+    async def test_rejected_messages_are_not_translated(self):
+        route = ChannelRoute(self.channel.id, source_language='es', target_language='en',
+                             guild_id=self.guild.id)
+        await self._burst(route)
+
+        stats = self.bot.admission.stats()
+        self.assertGreater(stats['rejected'], 0)
+        self.assertEqual(self.bot.translator.client.calls, BURST_SIZE - stats['rejected'])
+        self.assertAlmostEqual(self.bot.queue_manager.reserved_seconds(self.guild.id), 0.0)
+
+    async def test_burst_speeds_up_narration(self):
+        rate_controller = self.bot.tts.rate_controller
+        rate_controller.enabled = True
+        route = ChannelRoute(self.channel.id, guild_id=self.guild.id)
+        await self._burst(route)
+
+        # Con la ráfaga aún sin encolar, la velocidad ya debe haber subido
+        self.assertGreater(rate_controller.current(self.guild.id), rate_controller.base_rate)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Persistencia del registro de consumo en la base de estadísticas.
+
+Ejecutar desde src/:
+    python -m unittest tests.test_usage_ledger
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from models.stats import Database
+from services.usage_ledger import TIER_NORMAL, UsageLedger
+
+class UsageLedgerPersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='test_usage_ledger_')
+        self.db = Database(os.path.join(self.workdir, 'test.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _ledger(self) -> UsageLedger:
+        return UsageLedger(hourly_budget=1.0, daily_budget=4.0, store=self.db)
+
+    def test_restart_keeps_spend(self):
+        ledger = self._ledger()
+        for _ in range(50):
+            ledger.record('tts', 1_000, guild_id=1, channel_id=2, user_id=3,
+                          voice_name='en-US-Neural2-D')
+        ledger.flush()
+
+        reloaded = self._ledger()
+        self.assertAlmostEqual(reloaded.spend()[0], ledger.spend()[0])
+        self.assertAlmostEqual(reloaded.spend()[1], ledger.spend()[1])
+        self.assertEqual(reloaded.top('guild'), ledger.top('guild'))
+        self.assertEqual(reloaded.tier(), ledger.tier())
+        self.assertGreater(reloaded.tier(), TIER_NORMAL)
+
+    def test_old_hours_count_for_the_day_only(self):
+        hour = int(time.time() // 3600) - 5
+        self.db.save_usage_buckets([(hour, {('translate', 'guild', 1): [100_000, 10, 2.0]})])
+
+        hour_cost, day_cost = self._ledger().spend()
+        self.assertAlmostEqual(hour_cost, 0.0)
+        self.assertAlmostEqual(day_cost, 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
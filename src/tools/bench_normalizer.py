@@ -0,0 +1,50 @@
+"""Benchmark de TTSNormalizer.
+
+Uso (desde src/):
+    python -m tools.bench_normalizer [--iterations N]
+"""
+import argparse
+import time
+from services.text_normalizer import TTSNormalizer
+
+SAMPLE_MESSAGES = [
+    "<@123456789012345678> bought $AAPL!!!! up 5k shares, -3.2% today 🚀🚀🚀",
+    "**BREAKING** __NVDA__ +12.5% after earnings https://www.tradingview.com/chart/abc123?x=1",
+    "<a:fire:987654321098765432> <a:fire:987654321098765432> $TSLA calls printing!!! 2.5M volume",
+    "> Fed decision at 2pm\nrates unchanged, $SPY -0.8% <#111111111111111111>",
+    "stop loss hit on $AMD... out at -4%, next setup in 10 minutes",
+    "goooood morning traders ☀️☀️☀️ futures green green green",
+    "`$BTC` 65k resistance, market cap 1.2B on the alt, see https://x.com/someone/status/1",
+    "plain text alert without any markup"
+]
+
+def resolver(kind: str, object_id: int):
+    return {'user': 'Juan', 'role': 'Traders', 'channel': 'alerts'}[kind]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de normalización de texto para TTS")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    normalizer = TTSNormalizer()
+
+    print(f"{'chars':>5} {'-chars':>6} {'-seg':>6}  texto normalizado")
+    for message in SAMPLE_MESSAGES:
+        result = normalizer.normalize(message, 'en-US', resolver)
+        print(f"{result.original_chars:>5} {result.chars_saved:>6} {result.seconds_saved:>6.2f}  {result.text}")
+
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        normalizer.normalize(SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)], 'en-US', resolver)
+    elapsed = time.perf_counter() - start
+
+    stats = normalizer.stats()
+    print()
+    print(f"{args.iterations} mensajes en {elapsed:.3f}s ({elapsed / args.iterations * 1e6:.1f} µs/mensaje)")
+    print(f"Caracteres ahorrados: {stats['chars_saved']} de {stats['chars_in']} "
+          f"({stats['chars_saved'] / stats['chars_in'] * 100:.1f}%)")
+    print(f"Audio evitado: {stats['seconds_saved']:.0f}s "
+          f"({stats['seconds_saved'] / stats['messages']:.2f}s/mensaje)")
+
+if __name__ == "__main__":
+    main()
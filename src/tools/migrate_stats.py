@@ -0,0 +1,54 @@
+"""Migración y compactación de la base de estadísticas.
+
+Convierte las tablas con texto completo por fila al diccionario de textos,
+aplica opcionalmente la retención y compacta el archivo, mostrando el tamaño
+antes y después. Hay que ejecutarlo con el bot detenido; el bot no arranca
+con una base del esquema anterior. Con --if-needed no hace nada si la base
+ya está migrada (así lo usa el arranque de Docker).
+
+Uso (desde src/):
+    python -m tools.migrate_stats [--db data/bot.db] [--retention-days N] [--if-needed]
+"""
+import argparse
+from models.stats import Database
+
+def print_report(title: str, report: dict):
+    print(f"{title}: {report['bytes'] / 1048576:.2f} MB "
+          f"({report['page_count']} páginas de {report['page_size']} B, "
+          f"{report['freelist_count']} libres, auto_vacuum={report['auto_vacuum']})")
+    for table, rows in sorted(report['rows'].items()):
+        print(f"  {table:<20} {rows:>10} filas")
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrar y compactar la base de estadísticas")
+    parser.add_argument('--db', help="Ruta de la base (por defecto DB_PATH)")
+    parser.add_argument('--retention-days', type=float, default=0,
+                        help="Eliminar estadísticas más antiguas que N días (0 = conservar todo)")
+    parser.add_argument('--if-needed', action='store_true',
+                        help="Solo migrar si la base usa el esquema anterior")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.if_needed and not db.legacy_schema:
+        print("Estadísticas ya en el esquema actual, nada que migrar")
+        return
+    before = db.size_report()
+    print_report("Antes", before)
+
+    if db.needs_migration():
+        migrated = db.migrate_legacy_stats()
+        print(f"Migradas: {migrated['translation_stats']} traducciones, "
+              f"{migrated['tts_stats']} narraciones, {migrated['texts']} textos distintos")
+    if args.retention_days > 0:
+        removed = db.apply_retention(args.retention_days)
+        print(f"Retención: {removed}")
+    db.vacuum()
+
+    after = db.size_report()
+    print_report("Después", after)
+    saved = before['bytes'] - after['bytes']
+    if before['bytes']:
+        print(f"Ahorro: {saved / 1048576:.2f} MB ({saved / before['bytes'] * 100:.1f}%)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+"""Reproducción acelerada de tráfico real a través del pipeline del bot.
+
+Alimenta una traza de llegadas (capturada con TRAFFIC_CAPTURE_FILE o
+reconstruida desde translation_stats/tts_stats) a
+NarradorBot.process_channel_message con backends locales en lugar de Google
+y Discord: la traducción devuelve el mismo texto, la síntesis genera silencio
+WAV de la duración estimada y cada conexión de voz consume el stream al
+ritmo real multiplicado por --speed. Las latencias de los backends también
+se dividen por --speed.
+
+Muestra la profundidad de la cola a lo largo de la traza, los mensajes
+descartados y los percentiles de latencia (de la llegada al inicio de la
+reproducción), todo en segundos de la traza. A velocidades altas el trabajo
+de CPU del propio bot pesa --speed veces más que en producción.
+
+Uso (desde src/):
+    python -m tools.replay_traffic --trace data/traffic.jsonl [--speed 10]
+    python -m tools.replay_traffic --from-stats --hours 24 [--save data/traza.jsonl]
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+from bot.discord_bot import NarradorBot
+from models.stats import Database
+from services.router import ChannelRoute, ChannelRouter
+from services.traffic_trace import load_trace, save_trace, trace_from_stats
+from utils.tracing import Tracer
+
+SAMPLE_RATE = 48000
+
+REPLAY_WORDS = {
+    True: ['el', 'la', 'de', 'que', 'en', 'por', 'para', 'con', 'compra', 'venta', 'cierre',
+           'apertura', 'mercado', 'acciones', 'precio', 'soporte', 'resistencia', 'volumen'],
+    False: ['the', 'of', 'and', 'to', 'in', 'on', 'for', 'with', 'buy', 'sell', 'close',
+            'open', 'market', 'shares', 'price', 'support', 'resistance', 'volume']
+}
+
+def silent_wav(seconds: float) -> bytes:
+    """WAV PCM 16 bits mono a 48 kHz con ``seconds`` segundos de silencio"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b'\x00\x00' * int(seconds * SAMPLE_RATE))
+    return buffer.getvalue()
+
+def synthetic_text(event) -> str:
+    """Texto determinista de la longitud del evento; la misma plantilla da el mismo texto"""
+    rng = random.Random(event.template)
+    words = REPLAY_WORDS[bool(event.translate)]
+    parts, size = [], 0
+    while size < event.length:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return ' '.join(parts)[:event.length]
+
+class StandInTranslateClient:
+    """Sustituto de translate.Client: devuelve el texto tras la latencia configurada"""
+
+    def __init__(self, latency: float, speed: float):
+        self.latency = latency
+        self.speed = speed
+        self.calls = 0
+
+    def translate(self, text, target_language=None, source_language=None):
+        time.sleep(self.latency / self.speed)
+        self.calls += 1
+        return {'translatedText': text}
+
+class StandInTTSClient:
+    """Sustituto del cliente de Google TTS: silencio de la duración estimada del texto"""
+
+    def __init__(self, latency: float, speed: float, chars_per_second: float):
+        self.latency = latency
+        self.speed = speed
+        self.chars_per_second = chars_per_second
+        self.calls = 0
+
+    def synthesize_speech(self, input, voice, audio_config):
+        time.sleep(self.latency / self.speed)
+        self.calls += 1
+        rate = audio_config.speaking_rate or 1.0
+        seconds = len(input.text) / (self.chars_per_second * rate)
+        return SimpleNamespace(audio_content=silent_wav(seconds))
+
+class StandInVoiceClient:
+    """Conexión de voz que consume el stream en un hilo, como el reproductor de discord.py"""
+
+    def __init__(self, guild, channel, speed: float, latency: float):
+        self.guild = guild
+        self.channel = channel
+        self.speed = speed
+        self.latency = latency
+        self.source = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def play(self, source, after=None):
+        self.stop()
+        self.source = source
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._consume, args=(source, after, self._stop), name="replay-voice", daemon=True
+        )
+        self._thread.start()
+
+    def _consume(self, source, after, stop: threading.Event):
+        # Tramas de 20 ms; cada tick de 20 ms reales consume ``speed`` tramas
+        frames = 0.0
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            frames += self.speed
+            while frames >= 1:
+                source.read()
+                frames -= 1
+            next_tick += 0.02
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+        source.cleanup()
+        if after is not None:
+            after(None)
+
+    def is_playing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+
+    async def move_to(self, channel):
+        await asyncio.sleep(self.latency / self.speed)
+        self.channel = channel
+
+    async def disconnect(self, force: bool = False):
+        self.stop()
+        self.guild.voice_client = None
+
+class StandInVoiceChannel:
+    def __init__(self, channel_id: int, guild, speed: float, latency: float):
+        self.id = channel_id
+        self.name = f"voz-{channel_id}"
+        self.guild = guild
+        self.speed = speed
+        self.latency = latency
+
+    async def connect(self):
+        await asyncio.sleep(self.latency / self.speed)
+        self.guild.voice_client = StandInVoiceClient(self.guild, self, self.speed, self.latency)
+        return self.guild.voice_client
+
+class StandInGuild:
+    def __init__(self, guild_id: int, speed: float, voice_latency: float):
+        self.id = guild_id
+        self.name = f"servidor-{guild_id}"
+        self.voice_client = None
+        self.voice_channel = StandInVoiceChannel(guild_id * 1000, self, speed, voice_latency)
+
+    def get_member(self, member_id):
+        return None
+
+    def get_role(self, role_id):
+        return None
+
+    def get_channel(self, channel_id):
+        return self.voice_channel if channel_id == self.voice_channel.id else None
+
+class StandInTextChannel:
+    def __init__(self, channel_id: int, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+class ReplayHarness:
+    """Inyectar los eventos de la traza en el bot y medir la cola"""
+
+    def __init__(self, bot, events, speed: float, sample_interval: float, drain_timeout: float,
+                 voice_latency: float):
+        self.bot = bot
+        self.events = events
+        self.speed = speed
+        self.sample_interval = sample_interval
+        self.drain_timeout = drain_timeout
+        self.guilds: Dict[str, StandInGuild] = {}
+        self.channels: Dict[str, Tuple[StandInTextChannel, object]] = {}
+        self.samples: List[Tuple[float, int, float]] = []
+        self.errors = 0
+
+        routes = []
+        for event in events:
+            if event.guild not in self.guilds:
+                self.guilds[event.guild] = StandInGuild(len(self.guilds) + 1, speed, voice_latency)
+            if event.channel not in self.channels:
+                guild = self.guilds[event.guild]
+                channel = StandInTextChannel(100000 + len(self.channels), guild)
+                route = ChannelRoute(
+                    channel.id,
+                    source_language='es' if event.translate else 'en',
+                    target_language='en',
+                    guild_id=guild.id
+                )
+                self.channels[event.channel] = (channel, route)
+                routes.append(route)
+        bot.router = ChannelRouter(routes)
+
+    def _message(self, event, index: int):
+        channel, route = self.channels[event.channel]
+        guild = channel.guild
+        author = SimpleNamespace(
+            id=index % 50 + 1,
+            name=f"usuario-{index % 50 + 1}",
+            display_name=f"usuario-{index % 50 + 1}",
+            guild=guild,
+            voice=SimpleNamespace(channel=guild.voice_channel)
+        )
+        message = SimpleNamespace(content=synthetic_text(event), channel=channel, author=author, guild=guild)
+        return message, route
+
+    def _trace_time(self) -> float:
+        return (time.perf_counter() - self._start) * self.speed
+
+    async def _sample(self):
+        queue_manager = self.bot.queue_manager
+        while True:
+            depth = sum(queue_manager.queue_size(guild.id) for guild in self.guilds.values())
+            backlog = max((queue_manager.backlog_seconds(guild.id) for guild in self.guilds.values()),
+                          default=0.0)
+            self.samples.append((self._trace_time(), depth, backlog))
+            await asyncio.sleep(self.sample_interval / self.speed)
+
+    def _pending(self) -> int:
+        return sum(self.bot.queue_manager.queue_size(guild.id) for guild in self.guilds.values())
+
+    async def run(self):
+        first = self.events[0].timestamp
+        self._start = time.perf_counter()
+        sampler = asyncio.create_task(self._sample())
+        tasks = []
+        for index, event in enumerate(self.events):
+            delay = (event.timestamp - first) / self.speed - (time.perf_counter() - self._start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            message, route = self._message(event, index)
+            tasks.append(asyncio.create_task(self.bot.process_channel_message(message, route)))
+        await asyncio.gather(*tasks)
+
+        # Esperar a que las colas se vacíen
+        deadline = time.perf_counter() + self.drain_timeout / self.speed
+        while self._pending() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        self.duration = self._trace_time()
+        sampler.cancel()
+
+        for state in self.bot.queue_manager.guilds.values():
+            if state.task is not None:
+                state.task.cancel()
+        for guild in self.guilds.values():
+            if guild.voice_client is not None:
+                await guild.voice_client.disconnect()
+        self.errors = sum(channel.sent for channel, _ in self.channels.values())
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def print_report(harness: ReplayHarness, rows: int):
+    bot = harness.bot
+    traces = list(bot.tracer.buffer)
+    statuses = Counter(trace.status for trace in traces)
+    unfinished = len(harness.events) - len(traces)
+    latencies = []
+    for trace in traces:
+        playback = next((span for span in trace.spans if span.name == 'playback'), None)
+        if playback is not None:
+            latencies.append((playback.start - trace.start) * harness.speed)
+
+    print(f"\nEventos: {len(harness.events)} en {len(harness.guilds)} servidores y "
+          f"{len(harness.channels)} canales; duración simulada {harness.duration:.0f}s")
+
+    print("\nCola (máximos por intervalo):")
+    print(f"{'segundo':>9} {'elementos':>9} {'backlog':>8}")
+    if harness.samples:
+        size = max(1, -(-len(harness.samples) // rows))
+        for i in range(0, len(harness.samples), size):
+            window = harness.samples[i:i + size]
+            depth = max(sample[1] for sample in window)
+            backlog = max(sample[2] for sample in window)
+            print(f"{window[0][0]:>9.0f} {depth:>9} {backlog:>7.0f}s  {'#' * min(depth, 60)}")
+        print(f"Pico: {max(s[1] for s in harness.samples)} elementos, "
+              f"{max(s[2] for s in harness.samples):.0f}s de audio pendiente")
+
+    admission = bot.admission.stats()
+    print("\nResultado:")
+    for status, count in statuses.most_common():
+        print(f"  {status:<15} {count:>7}")
+    if unfinished:
+        print(f"  {'sin terminar':<15} {unfinished:>7}")
+    print(f"Admisión: {admission['summarized']} resumidos, {admission['rejected']} rechazados, "
+          f"{admission['seconds_shed']:.0f}s de audio evitados; {harness.errors} errores")
+
+    print("\nLatencia llegada -> reproducción:")
+    for label, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99)):
+        print(f"  {label}: {percentile(latencies, fraction):.2f}s")
+    if latencies:
+        print(f"  máx: {max(latencies):.2f}s")
+
+    translate = bot.translator.cache_stats()
+    audio = bot.audio_store.stats()
+    print(f"\nBackends: {bot.translator.client.calls} traducciones "
+          f"({translate['hits']} aciertos de caché), {bot.tts.client.calls} síntesis "
+          f"({audio['cache_hits']} aciertos de caché)")
+    if bot.loop_monitor is not None:
+        loop = bot.loop_monitor.stats()
+        print(f"Event loop: p99 {loop['p99_ms']:.0f} ms, máx {loop['max_ms']:.0f} ms, "
+              f"{loop['stalls']} bloqueos (tiempo real, no escalado)")
+
+def load_events(args, source_db: str):
+    if args.trace:
+        events = load_trace(args.trace)
+    else:
+        db = Database(source_db)
+        guild_of = {
+            int(route['channel_id']): int(route['guild_id'])
+            for route in db.get_channel_routes() if route.get('guild_id')
+        }
+        since = datetime.utcnow() - timedelta(hours=args.hours)
+        events = trace_from_stats(db, since, guild_of=guild_of)
+    if args.save:
+        save_trace(events, args.save)
+        print(f"Traza guardada en {args.save}: {len(events)} eventos")
+    if args.limit:
+        events = events[:args.limit]
+    return events
+
+async def replay(args, events):
+    bot = NarradorBot()
+    bot.translator._client = StandInTranslateClient(args.translate_latency, args.speed)
+    bot.tts._client = StandInTTSClient(args.tts_latency, args.speed, bot.config.TTS_CHARS_PER_SECOND)
+    bot.tracer = Tracer(buffer_size=len(events) + 1)
+    if bot.loop_monitor is not None:
+        bot.loop_monitor.start()
+
+    harness = ReplayHarness(bot, events, args.speed, args.sample_interval, args.drain_timeout,
+                            args.voice_latency)
+    try:
+        await harness.run()
+    finally:
+        if bot.loop_monitor is not None:
+            bot.loop_monitor.stop()
+    print_report(harness, args.rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducir tráfico capturado contra el pipeline del bot")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--trace', help="Traza JSONL capturada con TRAFFIC_CAPTURE_FILE")
+    source.add_argument('--from-stats', action='store_true',
+                        help="Reconstruir la traza desde las estadísticas de la base")
+    parser.add_argument('--db', help="Base de estadísticas para --from-stats (por defecto DB_PATH)")
+    parser.add_argument('--hours', type=float, default=24, help="Ventana de estadísticas para --from-stats")
+    parser.add_argument('--save', help="Guardar la traza cargada como JSONL")
+    parser.add_argument('--limit', type=int, default=0, help="Reproducir solo los primeros N eventos")
+    parser.add_argument('--speed', type=float, default=10.0, help="Aceleración (1 a 100)")
+    parser.add_argument('--translate-latency', type=float, default=0.15)
+    parser.add_argument('--tts-latency', type=float, default=0.4)
+    parser.add_argument('--voice-latency', type=float, default=0.5)
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                        help="Segundos de traza entre muestras de la cola")
+    parser.add_argument('--drain-timeout', type=float, default=600,
+                        help="Segundos de traza de espera a que se vacíe la cola al final")
+    parser.add_argument('--rows', type=int, default=20, help="Filas de la serie de la cola")
+    parser.add_argument('--log-level', default='ERROR', help="Nivel de log del bot durante la reproducción")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+    args.speed = min(100.0, max(1.0, args.speed))
+
+    # La base de origen se resuelve antes de redirigir la configuración del bot
+    load_dotenv()
+    source_db = args.db or os.getenv('DB_PATH', 'data/bot.db')
+
+    # El bot de la reproducción escribe en un directorio temporal y nunca llama a Google
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    os.environ.update({
+        'DB_PATH': os.path.join(workdir, 'replay.db'),
+        'AUDIO_TEMP_DIR': os.path.join(workdir, 'audio'),
+        'AUDIO_FORMAT': 'wav',
+        'SYNTH_WORKERS': '0',
+        'CACHE_WARMUP_ENABLED': 'false',
+        'STATS_RETENTION_DAYS': '0',
+        'TRAFFIC_CAPTURE_FILE': '',
+        'CHANNEL_ROUTES_FILE': '',
+        'VOICE_CHANNEL_ID': '',
+        'COMMAND_SYNC_STATE_FILE': os.path.join(workdir, 'command_sync.json')
+    })
+    for name in ('DISCORD_TOKEN', 'GOOGLE_CLOUD_PROJECT', 'GOOGLE_APPLICATION_CREDENTIALS'):
+        os.environ.setdefault(name, 'replay')
+
+    try:
+        events = load_events(args, source_db)
+        if not events:
+            print("La traza no tiene eventos")
+            return
+        asyncio.run(replay(args, events))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 class Config:
+    """Configuración inmutable del bot; usar get_config() para obtenerla"""
+
     def __init__(self):
         load_dotenv()
         
@@ -9,6 +12,12 @@ class Config:
         self.DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
         self.ENGLISH_CHANNEL_ID = os.getenv('ENGLISH_CHANNEL_ID')
         self.SPANISH_CHANNEL_ID = os.getenv('SPANISH_CHANNEL_ID')
+        self.CHANNEL_ROUTES_FILE = os.getenv('CHANNEL_ROUTES_FILE')
+        self.BOT_SHARDED = os.getenv('BOT_SHARDED', 'false').lower() in ('1', 'true', 'yes')
+        self.SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+        # Los comandos slash solo se sincronizan si cambian (o con COMMAND_SYNC_FORCE)
+        self.COMMAND_SYNC_STATE_FILE = os.getenv('COMMAND_SYNC_STATE_FILE', 'data/command_sync.json')
+        self.COMMAND_SYNC_FORCE = os.getenv('COMMAND_SYNC_FORCE', 'false').lower() in ('1', 'true', 'yes')
         
         # Google Cloud
         self.GOOGLE_CLOUD_PROJECT = os.getenv('GOOGLE_CLOUD_PROJECT')
@@ -19,10 +28,63 @@ class Config:
         self.TTS_VOICE_NAME = os.getenv('TTS_VOICE_NAME', 'en-US-Neural2-D')
         self.TTS_SPEAKING_RATE = float(os.getenv('TTS_SPEAKING_RATE', '1.0'))
         self.TTS_PITCH = float(os.getenv('TTS_PITCH', '0.0'))
+        self.TTS_CHARS_PER_SECOND = float(os.getenv('TTS_CHARS_PER_SECOND', '14.0'))
+        
+        # Velocidad adaptativa: de TTS_SPEAKING_RATE con la cola corta a TTS_RATE_MAX con la cola larga
+        self.TTS_ADAPTIVE_RATE = os.getenv('TTS_ADAPTIVE_RATE', 'true').lower() in ('1', 'true', 'yes')
+        self.TTS_RATE_MIN = float(os.getenv('TTS_RATE_MIN', '0.8'))
+        self.TTS_RATE_MAX = float(os.getenv('TTS_RATE_MAX', '1.4'))
+        self.TTS_RATE_BACKLOG_LOW = float(os.getenv('TTS_RATE_BACKLOG_LOW', '20'))
+        self.TTS_RATE_BACKLOG_HIGH = float(os.getenv('TTS_RATE_BACKLOG_HIGH', '90'))
+        self.TTS_RATE_HYSTERESIS = float(os.getenv('TTS_RATE_HYSTERESIS', '15'))
+        self.TTS_RATE_STEP = float(os.getenv('TTS_RATE_STEP', '0.05'))
+        
+        # Procesos trabajadores para Translate/TTS (0 = en el proceso principal)
+        self.SYNTH_WORKERS = int(os.getenv('SYNTH_WORKERS', '0'))
         
         # Audio
         self.AUDIO_TEMP_DIR = os.getenv('AUDIO_TEMP_DIR', 'temp_audio')
-        self.AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'mp3')
+        # wav: LINEAR16 a 48 kHz, se reproduce sin ffmpeg; mp3: se decodifica con ffmpeg
+        self.AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'wav')
+        self.AUDIO_MAX_BYTES = int(os.getenv('AUDIO_MAX_BYTES', str(500 * 1024 * 1024)))
+        self.AUDIO_MAX_AGE = float(os.getenv('AUDIO_MAX_AGE', '3600'))
+        self.AUDIO_JANITOR_INTERVAL = float(os.getenv('AUDIO_JANITOR_INTERVAL', '60'))
+        self.AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '2000'))
+        
+        # Precalentamiento de cachés con el historial de estadísticas
+        self.CACHE_WARMUP_ENABLED = os.getenv('CACHE_WARMUP_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.CACHE_WARMUP_BUDGET = int(os.getenv('CACHE_WARMUP_BUDGET', '200'))
+        self.CACHE_WARMUP_LOOKBACK_HOURS = float(os.getenv('CACHE_WARMUP_LOOKBACK_HOURS', '72'))
+        self.CACHE_WARMUP_MIN_COUNT = int(os.getenv('CACHE_WARMUP_MIN_COUNT', '3'))
+        self.CACHE_WARMUP_INTERVAL = float(os.getenv('CACHE_WARMUP_INTERVAL', '0'))
+        
+        # Voz
+        self.VOICE_IDLE_TIMEOUT = float(os.getenv('VOICE_IDLE_TIMEOUT', '30'))
+        self.VOICE_CHANNEL_ID = os.getenv('VOICE_CHANNEL_ID')
+        self.VOICE_BATCH_MAX_WAIT = float(os.getenv('VOICE_BATCH_MAX_WAIT', '20'))
+        self.VOICE_BATCH_MAX_RUN = int(os.getenv('VOICE_BATCH_MAX_RUN', '5'))
+        
+        # Control de admisión por tiempo de drenaje de la cola (0 = sin límite)
+        self.ADMISSION_MAX_BACKLOG_SECONDS = float(os.getenv('ADMISSION_MAX_BACKLOG_SECONDS', '180'))
+        # summarize: narrar solo la primera frase si así cabe; reject: descartar
+        self.ADMISSION_POLICY = os.getenv('ADMISSION_POLICY', 'summarize')
+        self.ADMISSION_SUMMARY_CHARS = int(os.getenv('ADMISSION_SUMMARY_CHARS', '120'))
+        
+        # Presupuesto de Google en USD (0 = sin límite) y degradación al acercarse al límite:
+        # voz Standard, textos recortados y sin traducción en canales de baja prioridad
+        self.USAGE_BUDGET_HOURLY = float(os.getenv('USAGE_BUDGET_HOURLY', '0'))
+        self.USAGE_BUDGET_DAILY = float(os.getenv('USAGE_BUDGET_DAILY', '0'))
+        self.USAGE_DEGRADE_THRESHOLDS = tuple(
+            float(value) for value in os.getenv('USAGE_DEGRADE_THRESHOLDS', '0.8,0.9,0.95').split(',') if value
+        )
+        self.USAGE_TRUNCATE_CHARS = int(os.getenv('USAGE_TRUNCATE_CHARS', '160'))
+        # Segundos entre guardados del consumo en la base (se recarga al arrancar)
+        self.USAGE_PERSIST_INTERVAL = float(os.getenv('USAGE_PERSIST_INTERVAL', '60'))
+        # USD por millón de caracteres
+        self.TTS_PREMIUM_PRICE = float(os.getenv('TTS_PREMIUM_PRICE', '16'))
+        self.TTS_STANDARD_PRICE = float(os.getenv('TTS_STANDARD_PRICE', '4'))
+        self.TRANSLATE_PRICE = float(os.getenv('TRANSLATE_PRICE', '20'))
         
         # Rate Limiting
         self.RATE_LIMIT_MESSAGES = int(os.getenv('RATE_LIMIT_MESSAGES', '5'))
@@ -30,20 +92,49 @@ class Config:
         
         # Database
         self.DB_PATH = os.getenv('DB_PATH', 'data/bot.db')
+        # Retención de estadísticas (0 = conservar todo)
+        self.STATS_RETENTION_DAYS = float(os.getenv('STATS_RETENTION_DAYS', '0'))
+        self.STATS_RETENTION_INTERVAL = float(os.getenv('STATS_RETENTION_INTERVAL', '3600'))
+        self.STATS_RETENTION_BATCH = int(os.getenv('STATS_RETENTION_BATCH', '5000'))
         
         # Logging
         self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
         self.LOG_FILE = os.getenv('LOG_FILE', 'logs/bot.log')
+        self.LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+        self.LOKI_URL = os.getenv('LOKI_URL')
+        self.LOKI_APP_LABEL = os.getenv('LOKI_APP_LABEL', 'narrador')
+        self.LOKI_BATCH_SIZE = int(os.getenv('LOKI_BATCH_SIZE', '100'))
+        self.LOKI_FLUSH_INTERVAL = float(os.getenv('LOKI_FLUSH_INTERVAL', '5.0'))
+        
+        # Tracing
+        self.TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '500'))
+        self.TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.0'))
+        # Captura anonimizada de llegadas de mensajes para tools.replay_traffic (vacío = desactivada)
+        self.TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE')
+        self.TRAFFIC_CAPTURE_SALT = os.getenv('TRAFFIC_CAPTURE_SALT')
+        
+        # Monitor del event loop
+        self.LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+        self.LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', '0.25'))
+        
+        # Perfilador por muestreo bajo demanda (/perfil)
+        self.PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.005'))
+        self.PROFILER_OUTPUT_DIR = os.getenv('PROFILER_OUTPUT_DIR', 'data/profiles')
         
         # Validación de configuración crítica
         self._validate_config()
+        self._frozen = True
+        
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"La configuración es inmutable: no se puede modificar {name}")
+        super().__setattr__(name, value)
         
     def _validate_config(self):
         """Validar configuración crítica"""
         required_vars = [
             'DISCORD_TOKEN',
-            'ENGLISH_CHANNEL_ID',
-            'SPANISH_CHANNEL_ID',
             'GOOGLE_CLOUD_PROJECT',
             'GOOGLE_APPLICATION_CREDENTIALS'
         ]
@@ -53,4 +144,9 @@ class Config:
         if missing_vars:
             raise ValueError(
                 f"Faltan las siguientes variables de entorno requeridas: {', '.join(missing_vars)}"
-            ) 
\ No newline at end of file
+            )
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Obtener la configuración, cargada una sola vez por proceso"""
+    return Config()
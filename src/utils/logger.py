@@ -1,20 +1,129 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from utils.config import Config
+import queue
+import threading
+import time
+import urllib.request
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+from utils.config import get_config
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional['DroppingQueueHandler'] = None
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta registros cuando la cola está llena.
+
+    Nunca bloquea al hilo que emite el log; los registros descartados se
+    cuentan en ``dropped``. El formato (incluidas las trazas de excepción)
+    lo aplican los handlers del QueueListener en el hilo de fondo.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo se resuelven msg % args, para que el registro no dependa de
+        # objetos que cambien después; exc_info se conserva sin formatear
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LokiBatchHandler(logging.Handler):
+    """Handler que envía registros a Loki en lotes.
+
+    Se ejecuta en el hilo del QueueListener, por lo que el envío HTTP nunca
+    ocurre en el event loop.
+    """
+
+    def __init__(self, url: str, labels: dict, batch_size: int = 100,
+                 flush_interval: float = 5.0, timeout: float = 5.0):
+        super().__init__()
+        self.url = url.rstrip('/') + '/loki/api/v1/push'
+        self.labels = labels
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.failed_batches = 0
+        self._batch: List[List[str]] = []
+        self._batch_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, name='loki-flush', daemon=True)
+        self._timer.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            entry = [str(int(record.created * 1e9)), self.format(record)]
+            with self._batch_lock:
+                self._batch.append(entry)
+                full = len(self._batch) >= self.batch_size
+            if full:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Enviar el lote pendiente a Loki"""
+        with self._batch_lock:
+            batch, self._batch = self._batch, []
+            self._last_flush = time.monotonic()
+        if not batch:
+            return
+
+        payload = json.dumps({
+            "streams": [{"stream": self.labels, "values": batch}]
+        }).encode('utf-8')
+        request = urllib.request.Request(
+            self.url,
+            data=payload,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception:
+            self.failed_batches += 1
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        super().close()
 
 def setup_logging():
-    """Configurar el sistema de logging"""
-    config = Config()
-    
+    """Configurar el sistema de logging.
+
+    Los handlers reales (archivo, consola y Loki opcional) se ejecutan en un
+    hilo de fondo a través de un QueueListener; el logger root solo encola.
+    """
+    global _listener, _queue_handler
+    config = get_config()
+
     # Crear directorio de logs si no existe
     os.makedirs(os.path.dirname(config.LOG_FILE), exist_ok=True)
-    
+
     # Configurar formato de logging
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
-    
+
     # Configurar handler para archivo
     file_handler = RotatingFileHandler(
         config.LOG_FILE,
@@ -23,20 +132,57 @@ def setup_logging():
         encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
-    
+
     # Configurar handler para consola
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    
+
+    handlers = [file_handler, console_handler]
+
+    # Configurar envío a Loki si está habilitado
+    if config.LOKI_URL:
+        loki_handler = LokiBatchHandler(
+            config.LOKI_URL,
+            labels={"app": config.LOKI_APP_LABEL},
+            batch_size=config.LOKI_BATCH_SIZE,
+            flush_interval=config.LOKI_FLUSH_INTERVAL
+        )
+        loki_handler.setFormatter(formatter)
+        handlers.append(loki_handler)
+
+    # Mover formato e I/O a un hilo de fondo
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
     # Configurar logger root
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, config.LOG_LEVEL.upper()))
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    root_logger.addHandler(_queue_handler)
+
     # Configurar loggers específicos
     logging.getLogger('discord').setLevel(logging.WARNING)
     logging.getLogger('google').setLevel(logging.WARNING)
-    
+
     # Log inicial
-    root_logger.info('Sistema de logging inicializado')
\ No newline at end of file
+    root_logger.info('Sistema de logging inicializado')
+
+def stop_logging():
+    """Vaciar la cola de logs y detener el hilo de fondo"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def get_logging_stats() -> dict:
+    """Obtener estadísticas del pipeline de logging"""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped
+    }
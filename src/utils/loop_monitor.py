@@ -0,0 +1,136 @@
+import asyncio
+import bisect
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de retraso; el último es +inf
+LAG_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+@dataclass
+class LoopStall:
+    """Bloqueo del event loop detectado por el watchdog"""
+    timestamp: datetime
+    duration: float  # segundos; se actualiza cuando el loop vuelve a responder
+    stack: str
+
+class LoopLagMonitor:
+    """Medir continuamente el retraso del event loop.
+
+    Una tarea duerme ``interval`` segundos y mide cuánto tarda de más en
+    despertar; el retraso se acumula en un histograma. Un hilo watchdog
+    vigila el latido de esa tarea y, si el loop lleva más de ``threshold``
+    segundos sin responder, captura la pila del hilo del loop para mostrar
+    qué callback lo está bloqueando.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, max_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.bucket_counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stalls: Deque[LoopStall] = deque(maxlen=max_stalls)
+        self._heartbeat = time.monotonic()
+        self._current_stall: Optional[LoopStall] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Iniciar la medición (desde el event loop a vigilar)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._heartbeat = time.monotonic()
+            self._record(lag)
+
+    def _record(self, lag: float):
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        self.bucket_counts[bisect.bisect_left(LAG_BUCKETS_MS, lag * 1000)] += 1
+
+        stall = self._current_stall
+        if stall is not None:
+            # El loop volvió a responder: cerrar el bloqueo con su duración final
+            stall.duration = lag
+            self._current_stall = None
+            logger.warning(f"Event loop bloqueado {lag * 1000:.0f} ms en:\n{stall.stack}")
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold or self._current_stall is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stall = LoopStall(
+                timestamp=datetime.utcnow(),
+                duration=blocked,
+                stack=''.join(traceback.format_stack(frame))
+            )
+            self._current_stall = stall
+            self.stalls.append(stall)
+            self.stall_count += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Percentil aproximado del retraso en ms (límite superior del bucket)"""
+        if not self.samples:
+            return 0.0
+        target = fraction * self.samples
+        cumulative = 0
+        for index, count in enumerate(self.bucket_counts):
+            cumulative += count
+            if cumulative >= target:
+                bound = LAG_BUCKETS_MS[index] if index < len(LAG_BUCKETS_MS) else float('inf')
+                return min(float(bound), self.max_lag * 1000)
+        return self.max_lag * 1000
+
+    def histogram(self) -> List[tuple]:
+        """Buckets del histograma como (etiqueta, cantidad)"""
+        labels = [f"≤{bound}ms" for bound in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        return list(zip(labels, self.bucket_counts))
+
+    def recent_stalls(self, limit: int = 5) -> List[LoopStall]:
+        return list(self.stalls)[-limit:][::-1]
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "average_ms": self.total_lag / self.samples * 1000 if self.samples else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_lag * 1000,
+            "stalls": self.stall_count
+        }
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# Marcos más internos que indican un hilo esperando, no trabajando
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker')
+}
+
+THREAD_SUFFIX_PATTERN = re.compile(r'[_-]\d+(_\d+)?$')
+
+class ProfilerBusy(Exception):
+    """Ya hay una sesión de perfilado en curso"""
+
+@dataclass
+class ProfileResult:
+    started_at: datetime
+    duration: float
+    samples: int
+    stacks: Counter = field(default_factory=Counter)  # pila colapsada -> muestras
+    idle: Counter = field(default_factory=Counter)  # hilo -> muestras en espera
+
+    def collapsed(self) -> str:
+        """Pilas en formato colapsado (una línea 'a;b;c N'), apto para flamegraph.pl o speedscope"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, directory: str) -> str:
+        """Guardar las pilas colapsadas en ``directory`` y devolver la ruta"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{self.started_at.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        return path
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """Funciones más calientes fuera de esperas: (función, muestras propias, acumuladas)"""
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if not frames or self._is_idle(frames[-1]):
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        return [(frame, count, cumulative[frame]) for frame, count in own.most_common(limit)]
+
+    def thread_busy(self) -> Dict[str, float]:
+        """Fracción de muestras con cada hilo trabajando (no esperando)"""
+        totals: Counter = Counter()
+        for stack, count in self.stacks.items():
+            totals[stack.split(';', 1)[0]] += count
+        return {
+            thread: (total - self.idle[thread]) / total
+            for thread, total in totals.most_common() if total
+        }
+
+    @staticmethod
+    def _is_idle(frame: str) -> bool:
+        match = re.match(r'(.+) \((.+):\d+\)$', frame)
+        return bool(match) and (match.group(2), match.group(1)) in IDLE_FRAMES
+
+class SamplingProfiler:
+    """Perfilador por muestreo de todos los hilos del proceso.
+
+    Durante una sesión, un hilo propio lee ``sys._current_frames()`` cada
+    ``interval`` segundos y acumula las pilas colapsadas del hilo del event
+    loop, los executors y el resto de hilos. Fuera de una sesión no hay
+    ningún hilo ni hook activo. Los procesos trabajadores (SYNTH_WORKERS) no
+    se incluyen.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, duration: float) -> ProfileResult:
+        """Muestrear el proceso durante ``duration`` segundos (una sesión a la vez)"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            self.sessions += 1
+            return await asyncio.to_thread(self._sample, duration)
+        finally:
+            self._lock.release()
+
+    def _sample(self, duration: float) -> ProfileResult:
+        own_thread = threading.get_ident()
+        result = ProfileResult(started_at=datetime.utcnow(), duration=duration, samples=0)
+        names: Dict[int, str] = {}
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if any(thread_id not in names for thread_id in frames):
+                names = {
+                    thread.ident: THREAD_SUFFIX_PATTERN.sub('', thread.name)
+                    for thread in threading.enumerate()
+                }
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread:
+                    continue
+                thread_name = names.get(thread_id, str(thread_id))
+                stack = self._collapse(frame)
+                result.stacks[f"{thread_name};{stack}"] += 1
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    result.idle[thread_name] += 1
+            result.samples += 1
+            time.sleep(self.interval)
+        return result
+
+    def _collapse(self, frame) -> str:
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(parts))
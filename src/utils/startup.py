@@ -0,0 +1,45 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """Medición de tiempos por fase del arranque en frío"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases: List[Tuple[str, float, float]] = []
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Medir una fase del arranque"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.origin, time.perf_counter() - start))
+
+    def mark_ready(self) -> bool:
+        """Marcar el bot como listo; devuelve False si ya se había marcado"""
+        if self.ready_at is not None:
+            return False
+        self.ready_at = time.perf_counter() - self.origin
+        return True
+
+    def report(self) -> str:
+        """Generar el reporte de tiempos de arranque"""
+        lines = [
+            f"{name:<28} +{offset:7.3f}s  {duration:7.3f}s"
+            for name, offset, duration in self.phases
+        ]
+        if self.ready_at is not None:
+            lines.append(f"{'listo':<28} +{self.ready_at:7.3f}s")
+        return "\n".join(lines)
+
+    def log_report(self):
+        logger.info("Tiempos de arranque:\n" + self.report())
+
+startup_timer = StartupTimer()
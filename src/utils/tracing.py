@@ -0,0 +1,159 @@
+import json
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger('narrador.trace')
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    end: float = 0.0
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+@dataclass
+class Trace:
+    trace_id: str
+    origin: str
+    guild_id: Optional[int] = None
+    channel_id: Optional[int] = None
+    user_id: Optional[int] = None
+    started_at: float = field(default_factory=time.time)
+    start: float = field(default_factory=time.perf_counter)
+    end: float = 0.0
+    status: str = "pending"
+    spans: List[Span] = field(default_factory=list)
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """Abrir una etapa del pipeline"""
+        span = Span(name=name, start=time.perf_counter(), attributes=attributes)
+        self.spans.append(span)
+        return span
+
+    def add_span(self, name: str, start: float, end: float, **attributes) -> Span:
+        """Registrar una etapa ya medida (tiempos de perf_counter)"""
+        span = Span(name=name, start=start, end=end, attributes=attributes)
+        self.spans.append(span)
+        return span
+
+    def end_span(self, span: Optional[Span], **attributes):
+        """Cerrar una etapa abierta con start_span"""
+        if span is None or span.end:
+            return
+        span.end = time.perf_counter()
+        span.attributes.update(attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Medir una etapa del pipeline como context manager"""
+        current = self.start_span(name, **attributes)
+        try:
+            yield current
+        except Exception as e:
+            current.attributes['error'] = e.__class__.__name__
+            raise
+        finally:
+            self.end_span(current)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def stage_durations(self) -> Dict[str, float]:
+        """Duración acumulada por etapa"""
+        durations: Dict[str, float] = {}
+        for span in self.spans:
+            durations[span.name] = durations.get(span.name, 0.0) + span.duration
+        return durations
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "origin": self.origin,
+            "guild_id": self.guild_id,
+            "channel_id": self.channel_id,
+            "user_id": self.user_id,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 4),
+            "status": self.status,
+            "spans": [
+                {
+                    "name": span.name,
+                    "offset": round(span.start - self.start, 4),
+                    "duration": round(span.duration, 4),
+                    **span.attributes
+                }
+                for span in self.spans
+            ]
+        }
+
+def traced(trace: Optional[Trace], name: str, **attributes):
+    """Abrir una etapa si hay traza activa, o no hacer nada"""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **attributes)
+
+class Tracer:
+    """Trazas por mensaje a lo largo del pipeline de narración.
+
+    Las trazas terminadas se guardan en un buffer circular en memoria y una
+    muestra de ellas se emite como JSON (un registro por etapa) en el logger
+    ``narrador.trace``.
+    """
+
+    def __init__(self, buffer_size: int = 500, sample_rate: float = 0.0):
+        self.buffer: Deque[Trace] = deque(maxlen=buffer_size)
+        self.sample_rate = sample_rate
+
+    def start_trace(self, origin: str, guild_id: Optional[int] = None,
+                    channel_id: Optional[int] = None, user_id: Optional[int] = None) -> Trace:
+        """Crear el contexto de traza para un mensaje"""
+        return Trace(
+            trace_id=uuid.uuid4().hex[:16],
+            origin=origin,
+            guild_id=guild_id,
+            channel_id=channel_id,
+            user_id=user_id
+        )
+
+    def finish(self, trace: Optional[Trace], status: str = "ok"):
+        """Cerrar una traza y registrarla"""
+        if trace is None or trace.end:
+            return
+        trace.end = time.perf_counter()
+        trace.status = status
+        for span in trace.spans:
+            trace.end_span(span)
+        self.buffer.append(trace)
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self._emit(trace)
+
+    def _emit(self, trace: Trace):
+        """Emitir un registro JSON por etapa de la traza"""
+        try:
+            data = trace.to_dict()
+            spans = data.pop("spans")
+            for span in spans:
+                trace_logger.info(json.dumps({**data, "span": span}, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Error emitiendo traza {trace.trace_id}: {str(e)}")
+
+    def slowest(self, limit: int = 5, guild_id: Optional[int] = None) -> List[Trace]:
+        """Obtener las trazas recientes más lentas"""
+        traces = [
+            trace for trace in self.buffer
+            if guild_id is None or trace.guild_id == guild_id
+        ]
+        return sorted(traces, key=lambda trace: trace.duration, reverse=True)[:limit]